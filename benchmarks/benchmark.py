@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+#
+# MolPDF - Benchmarks of the rendering and PDF pipeline
+#
+# -----------------------------------------------------
+
+# imports
+# -------
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Run from a checkout the script directory comes first on the path, the package next to it is benchmarked
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Building blocks of the synthetic molecules, the first and last atoms of every ring take the substituents
+# ---------------------------------------------------------------------------------------------------------
+_cores = [
+    'c1ccccc1', 'c1ccncc1', 'C1CCCCC1', 'C1CCNCC1', 'c1ccc2ccccc2c1', 'c1ccoc1', 'c1cc[nH]c1', 'C1CCOC1',
+    'c1ncncc1', 'C1CC1',
+]
+
+_prefixes = ['', 'C', 'CC', 'CC(C)', 'O', 'CO', 'N', 'CN(C)', 'F', 'Cl', 'Br', 'OC(=O)', 'NC(=O)', 'N#C',
+             'NS(=O)(=O)', 'FC(F)(F)', '[O-][N+](=O)']
+
+_substituents = ['', 'C', 'CC', 'C(C)C', 'O', 'OC', 'N', 'N(C)C', 'F', 'Cl', 'Br', 'C(=O)O', 'C(=O)N', 'C#N',
+                 'S(=O)(=O)N', 'C(F)(F)F', '[N+](=O)[O-]']
+
+_linkers = ['', 'C', 'CC', 'O', 'N', 'C(=O)', 'C(=O)N', 'S']
+
+# Ring closures of the second ring system are renumbered so they never clash with the first one
+_second_ring = str.maketrans('12', '34')
+
+# Broken SMILES, an unclosed ring, an unclosed branch, an unknown element and a bad charge
+_invalid = ['C1CC', 'CC(C', 'CXC', 'C[+]+C', 'c1cccc1(']
+
+# Configurations of MolPDF.generate
+# ---------------------------------
+CONFIGURATIONS = {
+    'table-png-files': {},
+    'table-png-memory': {'in_memory': True},
+    'table-pdf': {'render_format': 'pdf'},
+    'table-png-workers': {'workers': None},
+    'table-deduplicate': {'deduplicate': True, 'in_memory': True},
+    'table-smiles-index': {'smiles_index': True, 'in_memory': True},
+    'grid-png': {'grid': True, 'in_memory': True},
+    'grid-pdf': {'grid': True, 'render_format': 'pdf'},
+    'grid-pdf-workers': {'grid': True, 'render_format': 'pdf', 'workers': None},
+}
+
+
+def synthetic_smiles(count, invalid_fraction=0.05, seed=0):
+
+    """
+
+    Deterministic list of drug like SMILES, two ring systems joined by a linker with a substituent at both ends,
+    with a fraction of broken SMILES mixed in.
+
+    Arguments:
+        count (Int): number of SMILES
+        invalid_fraction (Float): fraction of the SMILES that Indigo can not load
+        seed (Int): seed of the generator, the same seed gives the same SMILES
+
+    Returns:
+        smiles (List): the SMILES strings
+
+    """
+
+    generator = random.Random(seed)
+    smiles = []
+
+    for _ in range(count):
+
+        if generator.random() < invalid_fraction:
+            smiles.append(generator.choice(_invalid))
+            continue
+
+        smiles.append(''.join((
+            generator.choice(_prefixes),
+            generator.choice(_cores),
+            generator.choice(_linkers),
+            generator.choice(_cores).translate(_second_ring),
+            generator.choice(_substituents),
+        )))
+
+    return smiles
+
+def _peak_rss():
+
+    """
+
+    Peak resident memory in bytes of the current process and of its finished children (the render workers).
+
+    """
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    return peak * scale
+
+def run_case(configuration, size, invalid_fraction, seed, workers, directory):
+
+    """
+
+    Generate one report and parse it back, meant to run in a fresh process so the peak memory belongs to the case.
+
+    Returns:
+        result (Dict): timings, throughput, memory and output size of the case
+
+    """
+
+    from molpdf import MolPDF, MolPDFParser
+
+    options = dict(CONFIGURATIONS[configuration])
+    if 'workers' in options:
+        options['workers'] = workers
+
+    smiles = synthetic_smiles(size, invalid_fraction, seed)
+    labels = ['molecule %d' % index for index in range(size)]
+    path = os.path.join(directory, '%s-%d.pdf' % (configuration, size))
+
+    document = MolPDF(name=path)
+
+    start = time.perf_counter()
+    stats = document.generate(smiles=smiles, labels=labels, **options)
+    generate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with MolPDFParser(path) as parser:
+        extracted = parser.extract_smiles()
+    extract_time = time.perf_counter() - start
+
+    result = {
+        'configuration': configuration,
+        'options': options,
+        'size': size,
+        'generate_seconds': generate_time,
+        'molecules_per_second': size / generate_time if generate_time else None,
+        'extract_seconds': extract_time,
+        'extracted': len(extracted),
+        'output_bytes': os.path.getsize(path),
+        'peak_rss_bytes': _peak_rss(),
+        'stats': stats.as_dict(),
+    }
+
+    if options.get('smiles_index') and size:
+        # Pages are numbered from 1, the middle page and molecule sit away from the start of the stream
+        page = max(1, (len(document.smiles_pages) + 1) // 2)
+
+        with MolPDFParser(path) as parser:
+            start = time.perf_counter()
+            parser.extract_smiles_at(size // 2)
+            result['extract_item_seconds'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result['page_molecules'] = len(parser.extract_page_smiles(page))
+            result['extract_page_seconds'] = time.perf_counter() - start
+
+    os.remove(path)
+
+    return result
+
+def environment():
+
+    """
+
+    Versions of the interpreter and of the libraries the results depend on.
+
+    """
+
+    import reportlab
+    import molpdf.molpdf
+    from indigo import Indigo
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'molpdf': molpdf.molpdf.MolPDF.__version__,
+        'reportlab': reportlab.Version,
+        'indigo': Indigo().version(),
+    }
+
+def run(sizes, configurations, invalid_fraction=0.05, seed=0, workers=4, repeat=1, progress=True):
+
+    """
+
+    Run every configuration against every size, each run in its own process.
+
+    Returns:
+        report (Dict): the environment and the list of results
+
+    """
+
+    # Taken first, a broken installation shows up here instead of after the runs
+    report = {
+        'environment': environment(),
+        'invalid_fraction': invalid_fraction,
+        'seed': seed,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': [],
+    }
+
+    directory = tempfile.mkdtemp(prefix='molpdf-benchmark-')
+    results = report['results']
+
+    try:
+        for size in sizes:
+            for configuration in configurations:
+                for attempt in range(repeat):
+                    try:
+                        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                            result = executor.submit(run_case, configuration, size, invalid_fraction, seed, workers,
+                                                     directory).result()
+                    except Exception as e:
+                        # A failing case is kept in the report, the other cases still run
+                        result = {'configuration': configuration, 'size': size, 'error': repr(e)}
+
+                    result['attempt'] = attempt
+                    results.append(result)
+
+                    if not progress:
+                        continue
+
+                    if 'error' in result:
+                        sys.stderr.write('%-20s %7d  failed: %s\n' % (configuration, size, result['error']))
+                    else:
+                        sys.stderr.write('%-20s %7d  %8.2fs  %8.1f mol/s  %10d bytes\n' % (
+                            configuration, size, result['generate_seconds'], result['molecules_per_second'] or 0,
+                            result['output_bytes']))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return report
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmark MolPDF.generate and MolPDFParser.extract_smiles.')
+    parser.add_argument('-o', '--output', default='benchmark.json', help="JSON report, '-' for stdout")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000, 100000])
+    parser.add_argument('--configurations', nargs='+', choices=sorted(CONFIGURATIONS),
+                        default=sorted(CONFIGURATIONS))
+    parser.add_argument('--invalid-fraction', type=float, default=0.05, help='fraction of broken SMILES')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--workers', type=int, default=4, help='render processes of the worker configurations')
+    parser.add_argument('--repeat', type=int, default=1, help='number of runs of every case')
+    parser.add_argument('--quiet', action='store_true', help='do not print the results as they come')
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.configurations, args.invalid_fraction, args.seed, args.workers, args.repeat,
+                 progress=not args.quiet)
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,5 +5,14 @@
 # ----------------------------
 from molpdf.molpdf import MolPDF
 from molpdf.molpdf import MolPDFParser
+from molpdf.molpdf import AsyncMolPDF
+from molpdf.molpdf import MolPDFBatchParser
+from molpdf.molpdf import MolRenderCache
+from molpdf.molpdf import MolCoordinateCache
+from molpdf.molpdf import MolRenderer
+from molpdf.molpdf import MolPDFStats
+from molpdf.molpdf import MolPDFError
+from molpdf.readers import MolReader
+from molpdf.readers import MolRecord
 
 name='MolPDF'
\ No newline at end of file
@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+#
+# Run the command line with python -m molpdf
+#
+# ------------------------------------------
+import sys
+
+from molpdf.cli import main
+
+sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+#
+# MolPDF - Command line entry point
+#
+# ---------------------------------
+
+# imports
+# -------
+import argparse
+import csv
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from itertools import tee
+
+from molpdf.molpdf import MolPDF, MolPDFBatchParser, MolRenderCache, MolCoordinateCache
+from molpdf.readers import MolReader
+
+
+class _Progress(object):
+
+    """
+
+    Prints the number of processed items and the throughput to stderr every few seconds.
+
+    """
+
+    def __init__(self, unit, enabled=True, interval=2.0):
+
+        self.unit = unit
+        self.enabled = enabled
+        self.interval = interval
+        self.count = 0
+        self.start = time.time()
+        self.last = self.start
+
+    def update(self, count=1):
+
+        self.count += count
+
+        now = time.time()
+        if self.enabled and now - self.last >= self.interval:
+            self.last = now
+            self._print(now)
+
+    def finish(self):
+
+        if self.enabled:
+            self._print(time.time())
+
+    def _print(self, now):
+
+        elapsed = max(now - self.start, 1e-9)
+        sys.stderr.write('%d %s (%.1f/s)\n' % (self.count, self.unit, self.count / elapsed))
+        sys.stderr.flush()
+
+def _write_stats(path, stats):
+
+    """
+
+    Write the MolPDFStats of a report as JSON, '-' writes them to stderr.
+
+    """
+
+    if path == '-':
+        json.dump(stats.as_dict(), sys.stderr, indent=2)
+        sys.stderr.write('\n')
+        return
+
+    with open(path, 'w') as f:
+        json.dump(stats.as_dict(), f, indent=2)
+
+def _write_errors(path, errors):
+
+    """
+
+    Write the molecules that failed to render as tab separated index, SMILES, label, stage and message lines,
+    '-' writes them to stderr.
+
+    """
+
+    output = sys.stderr if path == '-' else open(path, 'w', newline='')
+
+    try:
+        writer = csv.writer(output, delimiter='\t', lineterminator='\n')
+        writer.writerow(['index', 'smiles', 'label', 'stage', 'message'])
+        writer.writerows(errors)
+    finally:
+        if output is not sys.stderr:
+            output.close()
+
+def render(args):
+
+    """
+
+    Render the SMILES of a .smi, csv or SDF file into a MolPDF document.
+
+    """
+
+    progress = _Progress('molecules', enabled=args.progress)
+
+    def counted(records):
+        for record in records:
+            progress.update()
+            yield record
+
+    try:
+        with redirect_stdout(sys.stderr):
+            reader = MolReader(args.input, input_format=args.input_format, smiles_column=args.smiles_column,
+                               label_columns=args.label_column, delimiter=args.delimiter)
+    except ValueError:
+        args.parser.error('argument --label-column: field indices are expected for .smi input')
+
+    records = counted(reader)
+
+    try:
+        # Labels are read along with the SMILES, without them nothing is buffered by tee
+        if args.labels:
+            smiles_records, label_records = tee(records)
+            smiles = (smiles for smiles, _ in smiles_records)
+            labels = (label for _, label in label_records)
+        else:
+            smiles = (smiles for smiles, _ in records)
+            labels = []
+
+        # The PDF is written straight into stdout
+        output = sys.stdout.buffer if args.output == '-' else args.output
+
+        document = MolPDF(name=output)
+        if args.title:
+            document.add_title(args.title)
+            document.add_spacer()
+
+        options = dict(
+            include_failed_smiles=args.include_failed_smiles,
+            workers=args.workers,
+            in_memory=args.in_memory,
+            render_format=args.render_format,
+            cache=MolRenderCache(args.cache) if args.cache else None,
+            coordinates=MolCoordinateCache(args.coordinates) if args.coordinates else None,
+            scaffold=args.scaffold,
+            chunk_size=args.chunk_size,
+            smiles_index=args.smiles_index,
+            timeout=args.timeout,
+        )
+
+        # stdout may carry the PDF itself, keep anything printed while generating on stderr
+        with redirect_stdout(sys.stderr):
+            if args.update:
+                stats = document.update(smiles=smiles, labels=labels, **options)
+            else:
+                stats = document.generate(smiles=smiles, labels=labels,
+                                          shard_size=args.shard_size, shard_workers=args.shard_workers,
+                                          merge=args.merge, **options)
+
+        if args.output == '-':
+            output.flush()
+
+        if args.stats:
+            _write_stats(args.stats, stats)
+        if args.errors:
+            _write_errors(args.errors, document.errors)
+    finally:
+        records.close()
+
+    progress.finish()
+
+    return 0
+
+def extract(args):
+
+    """
+
+    Extract the SMILES of MolPDF documents as tab separated path, index and SMILES lines.
+
+    """
+
+    if args.inputs == ['-']:
+        file_paths = (line.strip() for line in sys.stdin if line.strip())
+    elif len(args.inputs) == 1:
+        file_paths = args.inputs[0]
+    else:
+        file_paths = args.inputs
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    progress = _Progress('documents', enabled=args.progress)
+
+    batch = MolPDFBatchParser(file_paths)
+
+    try:
+        for file_path, smiles_list in batch.extract_smiles(workers=args.workers, processes=args.processes):
+            progress.update()
+            if smiles_list is None:
+                sys.stderr.write('%s: %s\n' % (file_path, batch.errors[file_path]))
+                continue
+            for index, smiles in enumerate(smiles_list):
+                output.write('%s\t%d\t%s\n' % (file_path, index, smiles))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    progress.finish()
+
+    return 1 if batch.errors else 0
+
+def _build_parser():
+
+    parser = argparse.ArgumentParser(prog='molpdf', description='Bulk SMILES to PDF and PDF to SMILES jobs.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    render_parser = subparsers.add_parser('render', help='render a .smi, csv or SDF file, or a gzip of one, into a PDF')
+    render_parser.add_argument('input', help="input file, '-' for stdin")
+    render_parser.add_argument('-o', '--output', default='molecules.pdf', help="output PDF, '-' for stdout")
+    render_parser.add_argument('-f', '--input-format', choices=['smi', 'csv', 'tsv', 'sdf'],
+                               help='input format, guessed from the extension by default, gzip is detected')
+    render_parser.add_argument('--smiles-column', default='smiles', help='SMILES column of csv/tsv input')
+    render_parser.add_argument('--label-column', action='append', default=[],
+                               help='label column, property or field index, can be repeated')
+    render_parser.add_argument('--delimiter', help='delimiter of csv input')
+    render_parser.add_argument('--no-labels', dest='labels', action='store_false', help='do not print labels')
+    render_parser.add_argument('--title', help='title of the document')
+    render_parser.add_argument('--include-failed-smiles', action='store_true',
+                               help='keep a placeholder cell for the molecules that failed to render')
+    render_parser.add_argument('--errors', help="write the molecules that failed to render, '-' for stderr")
+    render_parser.add_argument('--timeout', type=float,
+                               help='seconds after which the layout of a molecule is cancelled')
+    render_parser.add_argument('-j', '--workers', type=int, default=1, help='number of render processes')
+    render_parser.add_argument('--in-memory', action='store_true', default=None,
+                               help='render the images in memory, the default when writing to stdout')
+    render_parser.add_argument('--render-format', choices=['png', 'pdf'], default='png')
+    render_parser.add_argument('--cache', help='directory of the render cache')
+    render_parser.add_argument('--coordinates', help='directory of the 2D coordinate cache')
+    render_parser.add_argument('--scaffold',
+                               help='SMILES or SMARTS of a core highlighted and aligned in every molecule')
+    render_parser.add_argument('--chunk-size', type=int, default=64)
+    render_parser.add_argument('--smiles-index', action='store_true', help='store an indexed SMILES stream')
+    render_parser.add_argument('--shard-size', type=int,
+                               help='split the output into PDFs of this many molecules listed in a manifest')
+    render_parser.add_argument('--shard-workers', type=int, default=1, help='number of shards built at once')
+    render_parser.add_argument('--merge', action='store_true', help='join the shards into the output PDF')
+    render_parser.add_argument('--update', action='store_true',
+                               help='only render the molecules that changed since the output was generated')
+    render_parser.add_argument('--progress', action='store_true', help='print progress to stderr')
+    render_parser.add_argument('--stats', help="write the timings and counters as JSON, '-' for stderr")
+    render_parser.set_defaults(function=render, parser=render_parser)
+
+    extract_parser = subparsers.add_parser('extract', help='extract the SMILES of MolPDF documents')
+    extract_parser.add_argument('inputs', nargs='+', help="documents or a glob pattern, '-' reads paths from stdin")
+    extract_parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    extract_parser.add_argument('-j', '--workers', type=int, default=8, help='number of documents read at once')
+    extract_parser.add_argument('--processes', action='store_true', help='use processes instead of threads')
+    extract_parser.add_argument('--progress', action='store_true', help='print progress to stderr')
+    extract_parser.set_defaults(function=extract)
+
+    return parser
+
+def main(argv=None):
+
+    args = _build_parser().parse_args(argv)
+
+    return args.function(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,21 +7,39 @@
 # imports
 # -------
 import os
+import json
+import asyncio
+import threading
 import tempfile
 import shutil
+import uuid
+import hashlib
+import zlib
+from io import BytesIO
+from xml.sax.saxutils import escape
+from array import array
 from indigo import *
 from functools import partial
+from collections import namedtuple, deque
+from contextlib import contextmanager
+from itertools import islice
+from bisect import bisect_right
+import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 import platform
 
 # PDFRW library modules
 # ---------------------
-from pdfrw import PdfReader, PdfWriter
+from pdfrw import PdfReader, PdfWriter, PdfDict, IndirectPdfDict, PdfArray, PdfName, PdfString
+from pdfrw.buildxobj import pagexobj
+from pdfrw.toreportlab import makerl
 
 # PDF library modules
 # -------------------
 from pdfminer.pdfparser import PDFParser
 from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdftypes import resolve1
 
 # Reportlab library modules
 # -------------------------
@@ -43,6 +61,10 @@ from reportlab.lib.utils import ImageReader
 # ------------------------
 from reportlab.pdfgen import canvas
 
+# Reportlab pdfbase modules
+# -------------------------
+from reportlab.pdfbase.pdfdoc import PDFInfo, PDFDictionary, PDFArray, PDFString, PDFName, PDFStream
+
 import time
 
 def timeit(method):
@@ -53,584 +75,3390 @@ def timeit(method):
         time_end = time.time()
 
 
-        if 'log_time' in kwargs:
-            name = kwargs.get('log_name', method.__name__.upper())
-            kwargs['log_time'][name] = int((time_end -time_start))
-        else:
-            print ('Method: %r Time: %2.2f seconds' % (method.__name__, ((time_end - time_start))))
-        return result
+        if 'log_time' in kwargs:
+            name = kwargs.get('log_name', method.__name__.upper())
+            kwargs['log_time'][name] = time_end - time_start
+        else:
+            print ('Method: %r Time: %2.2f seconds' % (method.__name__, ((time_end - time_start))))
+        return result
+
+    return timed
+
+# Render options shared by every molecule, part of the render cache key
+# ---------------------------------------------------------------------
+_render_options = (
+    ('render-image-size', 200, 200),
+    ('render-background-color', 1.0, 1.0, 1.0),
+)
+
+# Characters and height of a SMILES or label shown in a table cell, longer ones would make a group of rows
+# taller than a page, the full SMILES stays in the metadata
+# --------------------------------------------------------------------------------------------------------
+_cell_text_length = 120
+_cell_text_height = 1.5 * inch
+
+# Number of SMILES compressed together in one block of the indexed SMILES stream
+# -------------------------------------------------------------------------------
+_smiles_block_size = 1024
+
+# Suffix of the manifest listing the shards of a sharded report
+# -------------------------------------------------------------
+_manifest_suffix = '.manifest.json'
+
+class _SmilesStore(object):
+
+    """
+
+    Append only list of SMILES packed as UTF-8 into a single buffer with an array of offsets, a report keeps a few
+    bytes per molecule for its metadata instead of a Python string each. SMILES are decoded as they are read.
+
+    """
+
+    __slots__ = ('_data', '_offsets')
+
+    def __init__(self, smiles_list=()):
+
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self.extend(smiles_list)
+
+    def append(self, smiles):
+        self._data += smiles.encode('utf-8')
+        self._offsets.append(len(self._data))
+
+    def extend(self, smiles_list):
+        for smiles in smiles_list:
+            self.append(smiles)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('SMILES index out of range')
+
+        return self._data[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+class _ImageStore(object):
+
+    """
+
+    Images packed one after the other into a single buffer that spills into a temporary file past max_size,
+    an image is read back by its number only when it is drawn.
+
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024):
+
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self._offsets = array('Q', [0])
+
+    def append(self, image):
+
+        """
+
+        Arguments:
+            image (Bytes): the image
+
+        Returns:
+            number (Int): number of the image in the store
+
+        """
+
+        self._file.seek(self._offsets[-1])
+        self._file.write(image)
+        self._offsets.append(self._offsets[-1] + len(image))
+
+        return len(self._offsets) - 2
+
+    def __getitem__(self, number):
+
+        self._file.seek(self._offsets[number])
+
+        return self._file.read(self._offsets[number + 1] - self._offsets[number])
+
+    def close(self):
+        self._file.close()
+
+def _compress_smiles_blocks(smiles_list, block_size=_smiles_block_size):
+
+    """
+
+    Compress the SMILES into independent zlib blocks of newline delimited SMILES.
+
+    Arguments:
+        smiles_list (List): SMILES strings of the document
+        block_size (Int): number of SMILES in each block
+
+    Returns:
+        content (Bytes): the compressed blocks one after the other
+        offsets (List): byte offset of every block in the content, the last entry being the total length
+
+    """
+
+    blocks = []
+    offsets = [0]
+
+    for start in range(0, len(smiles_list), block_size):
+        block = zlib.compress('\n'.join(smiles_list[start:start + block_size]).encode('utf-8'))
+        blocks.append(block)
+        offsets.append(offsets[-1] + len(block))
+
+    return b''.join(blocks), offsets
+
+def _decompress_smiles_block(read, offsets, block):
+
+    """
+
+    Arguments:
+        read (Function): reads a byte range of the raw stream data
+        offsets (List): byte offset of every block in the stream
+        block (Int): number of the block
+
+    Returns:
+        smiles_list (List): the SMILES strings held in one block of the indexed SMILES stream
+
+    """
+
+    return zlib.decompress(read(offsets[block], offsets[block + 1])).decode('utf-8').split('\n')
+
+# Molecule that could not be rendered, the stage is one of load, layout or render
+# --------------------------------------------------------------------------------
+MolPDFError = namedtuple('MolPDFError', ['index', 'smiles', 'label', 'stage', 'message'])
+
+# Font size, characters per line and lines of the titles drawn under the molecules of a grid, wider or
+# taller titles make Indigo refuse to fit the grid in the image
+# ----------------------------------------------------------------------------------------------------
+_grid_title_font_size = 14
+_grid_title_width = 14
+_grid_title_lines = 3
+
+def _error_message(exception):
+
+    """
+
+    Text of an IndigoException, the bundled renderer raises them with bytes.
+
+    """
+
+    message = exception.args[0] if exception.args else ''
+    if isinstance(message, bytes):
+        return message.decode('utf-8', 'replace')
+
+    return str(message)
+
+def _timeout_option(timeout=None):
+
+    """
+
+    Arguments:
+        timeout (Float): seconds after which Indigo cancels the layout of a molecule, None never cancels
+
+    Returns:
+        option (Tuple): the Indigo timeout option in milliseconds
+
+    """
+
+    return ('timeout', max(1, int(timeout * 1000)) if timeout else 0)
+
+# Render worker session and caches
+# --------------------------------
+_worker_session = None
+_worker_cache = None
+_worker_coordinates = None
+
+def _initialize_render_worker(timeout=None, cache=None, coordinates=None):
+
+    """
+
+    Process pool initializer, every worker process holds its own Indigo session and renderer. The caches are
+    handed over once per worker instead of with every task so each worker keeps a running size of the cache
+    and walks its directory once.
+
+    """
+
+    global _worker_session, _worker_cache, _worker_coordinates
+
+    _worker_session = MolRenderer()
+    _worker_session.set_options(_timeout_option(timeout))
+    _worker_cache = cache
+    _worker_coordinates = coordinates
+
+def _load_molecule(indigo, smiles):
+
+    """
+
+    Load a SMILES, or the molfile carried by a MolRecord so the molecule keeps the coordinates it came with.
+
+    Returns:
+        molecule (IndigoObject): the loaded molecule
+        layout (Bool): whether the molecule still needs a 2D layout
+
+    """
+
+    molecule = indigo.loadMolecule(getattr(smiles, 'molfile', None) or smiles)
+
+    # Molfiles and CXSMILES may carry 2D coordinates already, missing or 3D ones are laid out
+    return molecule, not molecule.hasCoord() or molecule.hasZCoord()
+
+def _coordinates_key(molecule):
+
+    """
+
+    Digest of the 2D coordinates a molecule came with, part of the render cache key so a molfile with its own
+    layout is never served the image of the same structure laid out by Indigo.
+
+    """
+
+    return hashlib.sha1(repr([atom.xyz() for atom in molecule.iterateAtoms()]).encode('utf-8')).hexdigest()
+
+def _layout_molecule(indigo, molecule, coordinates=None, canonical_smiles=None):
+
+    """
+
+    Lay the molecule out in 2D, the coordinates of a structure laid out by a previous report are reused from
+    the coordinate cache so it is drawn the same way.
+
+    Arguments:
+        indigo (Indigo Object): session the molecule belongs to
+        molecule (IndigoObject): the molecule without coordinates
+        coordinates (MolCoordinateCache Object): optional cache of coordinates
+        canonical_smiles (String): canonical SMILES of the molecule when already known
+
+    Returns:
+        molecule (IndigoObject): the molecule with coordinates, loaded from the cache on a hit
+
+    """
+
+    if coordinates is None:
+        molecule.layout()
+        return molecule
+
+    key = coordinates.key(canonical_smiles or molecule.canonicalSmiles())
+    molfile = coordinates.get(key)
+
+    if molfile is not None:
+        return indigo.loadMolecule(molfile.decode('utf-8'))
+
+    molecule.layout()
+    coordinates.put(key, molecule.molfile().encode('utf-8'))
+
+    return molecule
+
+def _align_scaffold(session, molecule, scaffold):
+
+    """
+
+    Highlight the scaffold in a laid out molecule and turn the molecule so the scaffold has the orientation of
+    its own layout, every molecule of a series is then drawn the same way around the common core.
+
+    Returns:
+        molecule (IndigoObject): the highlighted copy of the molecule, the molecule itself if the scaffold is
+                                 not found in it
+
+    """
+
+    query, positions = session.scaffold(scaffold)
+
+    match = session.indigo.substructureMatcher(molecule).match(query)
+    if match is None:
+        return molecule
+
+    target = match.highlightedTarget()
+    atoms, xyz = [], []
+
+    for atom, position in positions:
+        mapped = match.mapAtom(atom)
+        if mapped is not None:
+            atoms.append(mapped.index())
+            xyz.extend(position)
+
+    if atoms:
+        target.alignAtoms(atoms, xyz)
+
+    return target
+
+def _render_molecule(session, smiles, temporary_directory, render_format='png', cache=None, coordinates=None,
+                     scaffold=None):
+
+    """
+
+    Load, layout and render a single SMILES into a png inside the temporary directory, or into memory
+    when no temporary directory is given.
+
+    Arguments:
+        session (MolRenderer Object): Indigo session and renderer used to load and draw the molecule
+        smiles (String): SMILES string of the molecule, a MolRecord is drawn from its molfile
+        temporary_directory (String): Directory where the png is written, None to render into memory
+        render_format (String): 'png' for a raster image or 'pdf' for a vector drawing
+        cache (MolRenderCache Object): Optional cache of previously rendered molecules
+        coordinates (MolCoordinateCache Object): Optional cache of the 2D coordinates of laid out molecules
+        scaffold (String): Optional SMILES or SMARTS of a core highlighted and aligned in the molecule
+
+    Returns:
+        image (String or Bytes): path of the rendered file or its bytes, None if the molecule failed.
+        cached (Bool): whether the image came out of the render cache.
+        error (Tuple): (stage, message) of the failure, None when the molecule was rendered.
+
+    """
+
+    indigo, renderer = session.indigo, session.renderer
+
+    # Any failure only costs this molecule, the stage tells where it went wrong
+    stage = 'load'
+
+    try:
+        molecule, layout = _load_molecule(indigo, smiles)
+
+        image = None
+        canonical = None
+
+        if cache is not None:
+            canonical = molecule.canonicalSmiles()
+            options = (render_format, scaffold) + _render_options
+            if not layout:
+                options += (('coordinates', _coordinates_key(molecule)), )
+            key = cache.key(canonical, options)
+            image = cache.get(key)
+
+        cached = image is not None
+
+        if not cached:
+
+            stage = 'layout'
+            if layout:
+                # if not called, will be done automatically by the renderer
+                molecule = _layout_molecule(indigo, molecule, coordinates, canonical)
+            if scaffold is not None:
+                molecule = _align_scaffold(session, molecule, scaffold)
+
+            stage = 'render'
+            session.set_options(("render-output-format", render_format), *_render_options)
+
+            if temporary_directory is None or cache is not None:
+                image = bytes(renderer.renderToBuffer(molecule))
+                if cache is not None:
+                    cache.put(key, image)
+
+        if temporary_directory is None:
+            return image, cached, None
+
+        path = os.path.join(temporary_directory,  str(uuid.uuid4()) + '.' + render_format)
+
+        if image is None:
+            renderer.renderToFile(molecule, filename=path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(image)
+
+    except IndigoException as e:
+        return None, False, (stage, _error_message(e))
+
+    return path, cached, None
+
+def _render_molecule_worker(smiles, temporary_directory, render_format='png', scaffold=None):
+
+    """
+
+    Render a single SMILES inside a process pool worker using the worker's own session and caches, the scaffold
+    query is compiled once per worker.
+
+    """
+
+    return _render_molecule(_worker_session, smiles, temporary_directory, render_format, _worker_cache,
+                            _worker_coordinates, scaffold)
+
+def _render_grid(session, molecules, columns, temporary_directory, render_format='png', cache=None,
+                 include_failed_smiles=False, coordinates=None, scaffold=None):
+
+    """
+
+    Render a whole block of molecules with a single grid render call, the SMILES and label of every molecule
+    are drawn by Indigo underneath its cell.
+
+    Arguments:
+        session (MolRenderer Object): Indigo session and renderer used to load and draw the molecules
+        molecules (List): (smiles, label) pairs of the block
+        columns (Int): number of molecules per row of the grid
+        temporary_directory (String): Directory where the image is written, None to render into memory
+        render_format (String): 'png' for a raster image or 'pdf' for a vector drawing
+        cache (MolRenderCache Object): Optional cache of previously rendered grids
+        include_failed_smiles (Bool): keep a cell for the SMILES that could not be loaded
+        coordinates (MolCoordinateCache Object): Optional cache of the 2D coordinates of laid out molecules
+        scaffold (String): Optional SMILES or SMARTS of a core highlighted and aligned in every molecule
+
+    Returns:
+        image (String or Bytes): path of the rendered file or its bytes, None if no molecule could be rendered.
+        cached (Bool): whether the image came out of the render cache.
+        rows (Int): number of rows of the grid.
+        failures (List): (position, stage, message) of every molecule of the block that failed.
+
+    """
+
+    indigo, renderer = session.indigo, session.renderer
+
+    entries = []
+    failures = []
+
+    def wrap(text):
+        lines = [line[start:start + _grid_title_width] for line in text.split('\n')
+                 for start in range(0, max(len(line), 1), _grid_title_width)]
+        # Long SMILES and labels are cut short, the full SMILES stays in the metadata of the document
+        if len(lines) > _grid_title_lines:
+            lines = lines[:_grid_title_lines]
+            lines[-1] = lines[-1][:_grid_title_width - 3] + '...'
+        return '\n'.join(lines)
+
+    def placeholder(smiles, label):
+        molecule = indigo.createMolecule()
+        title = 'Failed Rendering\n' + wrap(smiles)
+        if label is not None:
+            title += '\n' + wrap(label)
+        molecule.setProperty('molpdf-title', title)
+        return molecule, '', title
+
+    def render(entries, columns):
+        array = indigo.createArray()
+        for _, molecule, _, _ in entries:
+            array.arrayAdd(molecule)
+        rows = (len(entries) + columns - 1) // columns
+        session.set_options(
+            ("render-output-format", render_format),
+            ("render-image-size", 200 * columns, 200 * rows),
+            ("render-background-color", 1.0, 1.0, 1.0),
+            ("render-grid-title-property", "molpdf-title"),
+            ("render-grid-title-font-size", _grid_title_font_size),
+        )
+        return bytes(renderer.renderGridToBuffer(array, None, columns))
+
+    for position, (smiles, label) in enumerate(molecules):
+
+        stage = 'load'
+
+        try:
+            molecule, layout = _load_molecule(indigo, smiles)
+            canonical = molecule.canonicalSmiles()
+            stage = 'layout'
+            if layout:
+                molecule = _layout_molecule(indigo, molecule, coordinates, canonical)
+            if scaffold is not None:
+                molecule = _align_scaffold(session, molecule, scaffold)
+        except IndigoException as e:
+            failures.append((position, stage, _error_message(e)))
+            if include_failed_smiles:
+                entries.append((position, ) + placeholder(smiles, label))
+            continue
+
+        title = wrap(smiles)
+        if label is not None:
+            title += '\n' + wrap(label)
+
+        # Molecules drawn with the coordinates they came with are cached apart from the laid out ones
+        if not layout and cache is not None:
+            canonical = (canonical, _coordinates_key(molecule))
+
+        molecule.setProperty('molpdf-title', title)
+        entries.append((position, molecule, canonical, title))
+
+    if not entries:
+        return None, False, 0, failures
+
+    options = (render_format, columns, _grid_title_font_size, _grid_title_width, _grid_title_lines,
+               scaffold) + _render_options
+
+    def lookup(entries):
+        if cache is None:
+            return None, None
+        key = cache.key(tuple((canonical, title) for _, _, canonical, title in entries), options)
+        return key, cache.get(key)
+
+    key, image = lookup(entries)
+    cached = image is not None
+
+    if not cached:
+
+        try:
+            image = render(entries, columns)
+        except IndigoException:
+            # Draw the molecules of the block one at a time so only the ones Indigo can not fit are reported
+            kept = []
+            for entry in entries:
+                position, molecule, canonical, title = entry
+                try:
+                    render([entry], 1)
+                except IndigoException as e:
+                    failures.append((position, 'render', _error_message(e)))
+                    if not include_failed_smiles:
+                        continue
+                    entry = (position, ) + placeholder(*molecules[position])
+                kept.append(entry)
+
+            entries = kept
+            failures.sort()
+
+            if not entries:
+                return None, False, 0, failures
+
+            key, image = lookup(entries)
+            cached = image is not None
+
+            if not cached:
+                try:
+                    image = render(entries, columns)
+                except IndigoException as e:
+                    failed = set(failure[0] for failure in failures)
+                    failures.extend((position, 'render', _error_message(e))
+                                    for position, _, _, _ in entries if position not in failed)
+                    return None, False, 0, sorted(failures)
+
+        if cache is not None and not cached:
+            cache.put(key, image)
+
+    rows = (len(entries) + columns - 1) // columns
+
+    if temporary_directory is None:
+        return image, cached, rows, failures
+
+    path = os.path.join(temporary_directory,  str(uuid.uuid4()) + '.' + render_format)
+
+    with open(path, 'wb') as f:
+        f.write(image)
+
+    return path, cached, rows, failures
+
+def _render_grid_worker(molecules, columns, temporary_directory, render_format='png', include_failed_smiles=False,
+                        scaffold=None):
+
+    """
+
+    Render a grid inside a process pool worker using the worker's own session and caches.
+
+    """
+
+    return _render_grid(_worker_session, molecules, columns, temporary_directory, render_format, _worker_cache,
+                        include_failed_smiles, _worker_coordinates, scaffold)
+
+class MolRenderer(object):
+
+    """
+
+    Long lived Indigo session and renderer that many MolPDF reports can share, a worker serving many small reports
+    does not pay for a new session on every one, and the render options are only applied when they change.
+
+    """
+
+    __version__ = '0.1.0'
+
+    def __init__ (self):
+
+        self.indigo = Indigo()
+        self.renderer = IndigoRenderer(self.indigo)
+        self._options = {}
+        self._scaffolds = {}
+
+    def set_options(self, *options):
+
+        """
+
+        Arguments:
+            options (Tuple): (name, value, ...) of every Indigo option, the ones already set are skipped
+
+        """
+
+        for option in options:
+            name, values = option[0], option[1:]
+            if self._options.get(name) != values:
+                self.indigo.setOption(name, *values)
+                self._options[name] = values
+
+    def scaffold(self, scaffold):
+
+        """
+
+        Compile a scaffold query once for the session, every molecule of a report is matched against the same
+        query object.
+
+        Arguments:
+            scaffold (String): SMILES or SMARTS of the scaffold
+
+        Returns:
+            query (IndigoObject): the query molecule
+            positions (List): (atom, xyz) of every atom of the query laid out in 2D, the orientation the molecules
+                              are aligned to
+
+        """
+
+        if scaffold not in self._scaffolds:
+            try:
+                query = self.indigo.loadQueryMolecule(scaffold)
+            except IndigoException:
+                query = self.indigo.loadSmarts(scaffold)
+            query.layout()
+            self._scaffolds[scaffold] = query, [(atom, atom.xyz()) for atom in query.iterateAtoms()]
+
+        return self._scaffolds[scaffold]
+
+class MolRenderCache(object):
+
+    """
+
+    Persistent on-disk cache of rendered molecules keyed by the canonical SMILES and the render options.
+    Entries are evicted least recently used first once the cache grows past its size cap.
+
+    """
+
+    __version__ = '0.1.0'
+
+    def __init__ (self, directory, max_size=512 * 1024 * 1024):
+
+        """
+
+        Arguments:
+            directory (String): directory holding the cached images, created if missing
+            max_size (Int): size cap of the cache in bytes
+
+        """
+
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, canonical_smiles, options):
+
+        """
+
+        Arguments:
+            canonical_smiles (String): canonical SMILES of the molecule
+            options (Tuple): render options the image was produced with
+
+        Returns:
+            key (String): content address of the rendered image
+
+        """
+
+        return hashlib.sha1(repr((canonical_smiles, options)).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+
+        """
+
+        Arguments:
+            key (String): content address coming from MolRenderCache.key
+
+        Returns:
+            image (Bytes): the cached image, None if the molecule was never rendered
+
+        """
+
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                image = f.read()
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path, None)
+        except OSError:
+            return None
+
+        return image
+
+    def put(self, key, image):
+
+        """
+
+        Arguments:
+            key (String): content address coming from MolRenderCache.key
+            image (Bytes): rendered image of the molecule
+
+        """
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write then rename so concurrent workers never read a partial image, the cache is best effort
+        temporary_path = '%s.%s' % (path, uuid.uuid4().hex)
+        try:
+            with open(temporary_path, 'wb') as f:
+                f.write(image)
+            os.replace(temporary_path, path)
+        except OSError:
+            return
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += len(image)
+
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self):
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                # Skip images still being written by another process
+                if '.' in name:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def size(self):
+
+        """
+
+        Returns:
+            size (Int): total size in bytes of the cached images
+
+        """
+
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+
+        """
+
+        Remove the least recently used images until the cache is back under 90% of its size cap.
+
+        """
+
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_size * 0.9
+
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+        self._size = size
+
+class MolCoordinateCache(MolRenderCache):
+
+    """
+
+    Persistent on-disk cache of 2D coordinates, the molfile of every molecule Indigo lays out is kept under its
+    canonical SMILES so later reports skip the layout and draw the structure the same way from one version
+    of a report to the next.
+
+    """
+
+    __version__ = '0.1.0'
+
+    def __init__ (self, directory, max_size=128 * 1024 * 1024):
+
+        """
+
+        Arguments:
+            directory (String): directory holding the cached molfiles, created if missing
+            max_size (Int): size cap of the cache in bytes
+
+        """
+
+        MolRenderCache.__init__(self, directory, max_size)
+
+    def key(self, canonical_smiles):
+
+        """
+
+        Arguments:
+            canonical_smiles (String): canonical SMILES of the molecule
+
+        Returns:
+            key (String): content address of the molfile
+
+        """
+
+        return MolRenderCache.key(self, canonical_smiles, ('molfile', ))
+
+class MolPDFStats(object):
+
+    """
+
+    Timings and counters of a single MolPDF.generate call, returned by generate and handed to its callback.
+
+    The timings are wall clock seconds per stage, a stage running inside another one (the molecules are rendered
+    while reportlab lays out the pages) is taken out of the outer stage so the stages add up to the total:
+
+        parse: reading the SMILES out of the input
+        deduplicate: canonicalizing the SMILES of a deduplicated report
+        render: waiting for the molecule or grid images, Indigo's layout and rendering when there are no workers
+        table: building the image flowables and the tables of every chunk
+        layout: reportlab flowing the tables into pages and drawing them
+        metadata: building the SMILES metadata of the document
+        write: serializing the document to the file
+        merge: joining the shards of a sharded report into one document
+
+    """
+
+    def __init__(self):
+
+        self.timings = {}
+        self.molecules = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.pages = 0
+        self.bytes_written = 0
+        self._stages = []
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    @contextmanager
+    def stage(self, name):
+
+        """
+
+        Time the block under the given stage name, the enclosing stage is paused meanwhile.
+
+        Arguments:
+            name (String): name of the stage
+
+        """
+
+        now = time.perf_counter()
+        if self._stages:
+            self._add(*self._stages[-1], now)
+
+        self._stages.append((name, now))
+
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._add(*self._stages.pop(), now)
+            if self._stages:
+                self._stages[-1] = (self._stages[-1][0], now)
+
+    def _add(self, name, start, end):
+        self.timings[name] = self.timings.get(name, 0.0) + end - start
+
+    def add(self, other):
+
+        """
+
+        Add the timings and counters of another report, the shards of a sharded report add up to its stats.
+
+        Arguments:
+            other (MolPDFStats Object): stats of the other report
+
+        """
+
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+        self.molecules += other.molecules
+        self.failures += other.failures
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.pages += other.pages
+        self.bytes_written += other.bytes_written
+
+    def as_dict(self):
+
+        """
+
+        Returns:
+            stats (Dict): counters and timings, suited to be sent to a metrics system or dumped as JSON.
+
+        """
+
+        return {
+            'molecules': self.molecules,
+            'failures': self.failures,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'pages': self.pages,
+            'bytes_written': self.bytes_written,
+            'total': self.total,
+            'timings': dict(self.timings),
+        }
+
+    def __repr__(self):
+        return 'MolPDFStats(%s)' % ', '.join('%s=%r' % item for item in self.as_dict().items())
+
+class RaiseMoleculeError(Exception):
+
+    __version_error_parser__ = "1.1.0"
+    __allow_update__ = False
+
+    """
+
+    Raise Molecule Error if for some reason we can't evaluate a SMILES, 2D, or 3D molecule.
+
+    """
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+class flowable_fig(Flowable):
+
+    def __init__(self, imgdata):
+        Flowable.__init__(self)
+        self.img = ImageReader(imgdata)
+
+    def draw(self):
+        self.canv.drawImage(self.img, 0, 0, height = -2*inch, width=4*inch)
+
+class flowable_vector(Flowable):
+
+    """
+
+    Vector drawing of a molecule, the single page PDF coming out of Indigo is embedded as a form XObject
+    and scaled into the box of the flowable.
+
+    """
+
+    def __init__(self, pdfdata, width, height):
+        Flowable.__init__(self)
+        # A form XObject already built from the drawing is shared as is, reportlab then embeds it only once
+        self.xobj = pdfdata if isinstance(pdfdata, PdfDict) else pagexobj(PdfReader(fdata=pdfdata).pages[0])
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        x1, y1, x2, y2 = [float(value) for value in self.xobj.BBox]
+        scale = min(self.width / (x2 - x1), self.height / (y2 - y1))
+
+        self.canv.saveState()
+        self.canv.translate((self.width - (x2 - x1) * scale) / 2, (self.height - (y2 - y1) * scale) / 2)
+        self.canv.scale(scale, scale)
+        self.canv.translate(-x1, -y1)
+        self.canv.doForm(makerl(self.canv, self.xobj))
+        self.canv.restoreState()
+
+
+class _FastPathError(Exception):
+
+    """
+
+    Raised by the _PDFObjectReader when a document uses a layout it does not handle, the parser then falls back
+    to pdfminer.
+
+    """
+
+_PDFReference = namedtuple('_PDFReference', 'objid generation')
+
+_pdf_whitespace = b' \t\r\n\x00\x0c'
+_pdf_delimiters = b'()<>[]{}/%'
+_pdf_escapes = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+class _PDFLexer(object):
+
+    """
+
+    Tokenizer over a PDF file starting at an offset, the file is read in small pieces as the tokens are consumed.
+
+    """
+
+    def __init__(self, fp, offset):
+        fp.seek(offset)
+        self.fp = fp
+        self.offset = offset
+        self.buffer = b''
+        self.position = 0
+        self.pushed = []
+
+    def _peek(self, size=1):
+        while len(self.buffer) - self.position < size:
+            data = self.fp.read(65536)
+            if not data:
+                break
+            self.offset += self.position
+            self.buffer = self.buffer[self.position:] + data
+            self.position = 0
+        return self.buffer[self.position:self.position + size]
+
+    def _read(self, size=1):
+        data = self._peek(size)
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.offset + self.position
+
+    def push(self, token):
+        self.pushed.append(token)
+
+    def next_token(self):
+
+        """
+
+        Returns:
+            token (Tuple): kind of the token and its value, kind being one of
+                           'delimiter', 'name', 'string', 'number' or 'keyword'
+
+        """
+
+        if self.pushed:
+            return self.pushed.pop()
+
+        while True:
+            character = self._peek()
+            if not character:
+                raise _FastPathError('unexpected end of file')
+            if character in _pdf_whitespace:
+                self.position += 1
+            elif character == b'%':
+                while self._peek() not in (b'\r', b'\n', b''):
+                    self.position += 1
+            else:
+                break
+
+        if character in (b'[', b']'):
+            self.position += 1
+            return 'delimiter', character
+
+        if character in (b'<', b'>'):
+            if self._peek(2) in (b'<<', b'>>'):
+                return 'delimiter', self._read(2)
+            if character == b'>':
+                raise _FastPathError('unexpected >')
+            self.position += 1
+            digits = b''
+            while self._peek() != b'>':
+                digits += self._read()
+            self.position += 1
+            digits = bytes(c for c in digits if c not in _pdf_whitespace)
+            return 'string', bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode('ascii'))
+
+        if character == b'(':
+            self.position += 1
+            return 'string', self._read_string()
+
+        if character == b'/':
+            self.position += 1
+            return 'name', self._read_regular().decode('latin-1')
+
+        token = self._read_regular()
+        try:
+            return 'number', int(token)
+        except ValueError:
+            pass
+        try:
+            return 'number', float(token)
+        except ValueError:
+            return 'keyword', token
+
+    def _read_regular(self):
+        token = b''
+        while True:
+            character = self._peek()
+            if not character or character in _pdf_whitespace or character in _pdf_delimiters:
+                break
+            token += self._read()
+        return token.replace(b'#20', b' ')
+
+    def _read_string(self):
+        value = bytearray()
+        depth = 1
+        while True:
+            character = self._read()
+            if not character:
+                raise _FastPathError('unterminated string')
+            if character == b'\\':
+                character = self._read()
+                if character in _pdf_escapes:
+                    value += _pdf_escapes[character]
+                elif character in b'01234567':
+                    digits = character
+                    while len(digits) < 3 and self._peek() in (b'0', b'1', b'2', b'3', b'4', b'5', b'6', b'7'):
+                        digits += self._read()
+                    value.append(int(digits, 8) & 0xff)
+                elif character == b'\r':
+                    if self._peek() == b'\n':
+                        self.position += 1
+                elif character != b'\n':
+                    value += character
+                continue
+            if character == b'(':
+                depth += 1
+            elif character == b')':
+                depth -= 1
+                if not depth:
+                    return bytes(value)
+            value += character
+
+class _PDFObjectReader(object):
+
+    """
+
+    Minimal reader following the classic xref tables of a PDF from its trailer, objects are resolved one at a time
+    by seeking to their offset so only the info dictionary and the SMILES stream are ever read.
+
+    """
+
+    def __init__(self, fp):
+
+        self.fp = fp
+        self.sections = []
+        self.trailer = {}
+
+        fp.seek(0, 2)
+        size = fp.tell()
+        fp.seek(max(0, size - 1024))
+        tail = fp.read()
+
+        position = tail.rfind(b'startxref')
+        if position < 0:
+            raise _FastPathError('startxref not found')
+
+        offset = int(tail[position + len(b'startxref'):].split()[0])
+        self.startxref = offset
+        seen = set()
+
+        # Follow the /Prev chain of incremental updates, the latest section comes first
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            trailer = self._read_xref_section(offset)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            offset = trailer.get('Prev')
+
+    def _read_xref_section(self, offset):
+
+        self.fp.seek(offset)
+        line = self.fp.readline()
+        if line.strip() != b'xref':
+            raise _FastPathError('cross reference streams are not supported')
+
+        subsections = []
+
+        while True:
+            position = self.fp.tell()
+            line = self.fp.readline()
+            if line.strip().startswith(b'trailer'):
+                break
+            fields = line.split()
+            if len(fields) != 2:
+                raise _FastPathError('malformed cross reference table')
+            start, count = int(fields[0]), int(fields[1])
+            subsections.append((start, count, self.fp.tell()))
+            # Every entry of the table is exactly 20 bytes long
+            self.fp.seek(self.fp.tell() + 20 * count)
+
+        self.sections.append(subsections)
+
+        lexer = _PDFLexer(self.fp, position)
+        kind, value = lexer.next_token()
+        if value != b'trailer':
+            raise _FastPathError('trailer not found')
+
+        trailer = self._parse(lexer)
+        if not isinstance(trailer, dict):
+            raise _FastPathError('malformed trailer')
+
+        return trailer
+
+    def _lookup(self, objid):
+
+        for subsections in self.sections:
+            for start, count, position in subsections:
+                if start <= objid < start + count:
+                    self.fp.seek(position + 20 * (objid - start))
+                    entry = self.fp.read(20).split()
+                    if len(entry) < 3:
+                        raise _FastPathError('malformed cross reference entry')
+                    if entry[2] == b'n':
+                        return int(entry[0])
+                    return None
+
+        return None
+
+    def read_object(self, reference):
+
+        """
+
+        Arguments:
+            reference (_PDFReference): reference of the object
+
+        Returns:
+            value (Object): the parsed object, None if it is not in the document
+            stream_offset (Int): file offset of the stream data when the object is a stream, None otherwise
+
+        """
+
+        offset = self._lookup(reference.objid)
+        if offset is None:
+            return None, None
+
+        lexer = _PDFLexer(self.fp, offset)
+        objid, generation, keyword = lexer.next_token(), lexer.next_token(), lexer.next_token()
+        if objid != ('number', reference.objid) or keyword != ('keyword', b'obj'):
+            raise _FastPathError('object %d not found at its offset' % reference.objid)
+
+        value = self._parse(lexer)
+
+        kind, token = lexer.next_token()
+        if token != b'stream':
+            return value, None
+
+        # Stream data starts after the end of line following the keyword
+        if lexer._peek() == b'\r':
+            lexer.position += 1
+        if lexer._peek() == b'\n':
+            lexer.position += 1
+
+        return value, lexer.tell()
+
+    def resolve(self, value):
+
+        while isinstance(value, _PDFReference):
+            value, _ = self.read_object(value)
+
+        return value
+
+    def read(self, offset, size):
+
+        self.fp.seek(offset)
+
+        return self.fp.read(size)
+
+    def _parse(self, lexer):
+
+        kind, value = lexer.next_token()
+
+        if kind == 'delimiter' and value == b'<<':
+            dictionary = {}
+            while True:
+                kind, key = lexer.next_token()
+                if kind == 'delimiter' and key == b'>>':
+                    return dictionary
+                if kind != 'name':
+                    raise _FastPathError('dictionary key is not a name')
+                dictionary[key] = self._parse(lexer)
+
+        if kind == 'delimiter' and value == b'[':
+            array = []
+            while True:
+                kind, item = lexer.next_token()
+                if kind == 'delimiter' and item == b']':
+                    return array
+                lexer.push((kind, item))
+                array.append(self._parse(lexer))
+
+        if kind == 'number' and isinstance(value, int):
+            # An integer might be the start of an indirect reference "objid generation R"
+            second = lexer.next_token()
+            if second[0] == 'number' and isinstance(second[1], int):
+                third = lexer.next_token()
+                if third == ('keyword', b'R'):
+                    return _PDFReference(value, second[1])
+                lexer.push(third)
+            lexer.push(second)
+            return value
+
+        if kind in ('number', 'string', 'name'):
+            return value
+
+        if kind == 'keyword' and value in (b'true', b'false', b'null'):
+            return {b'true': True, b'false': False, b'null': None}[value]
+
+        raise _FastPathError('unexpected token %r' % (value, ))
+
+def _format_pdf_value(value):
+
+    """
+
+    Serialize a value read by the _PDFObjectReader back into PDF syntax, names are kept as str and strings
+    as bytes.
+
+    """
+
+    if isinstance(value, _PDFReference):
+        return b'%d %d R' % value
+
+    if isinstance(value, dict):
+        return b'<<' + b' '.join(_format_pdf_value(key) + b' ' + _format_pdf_value(item)
+                                 for key, item in value.items()) + b'>>'
+
+    if isinstance(value, list):
+        return b'[' + b' '.join(_format_pdf_value(item) for item in value) + b']'
+
+    if value is None:
+        return b'null'
+
+    if isinstance(value, bool):
+        return b'true' if value else b'false'
+
+    if isinstance(value, int):
+        return b'%d' % value
+
+    if isinstance(value, float):
+        return ('%.6f' % value).rstrip('0').rstrip('.').encode('ascii')
+
+    if isinstance(value, bytes):
+        return b'<' + value.hex().encode('ascii') + b'>'
+
+    return b'/' + value.replace(' ', '#20').encode('latin-1')
+
+class _PDFIncrementalUpdate(object):
+
+    """
+
+    Incremental update section of a PDF, objects are added or redefined by appending them to the end of the file
+    with their own cross reference table, the bytes of the original document are never rewritten.
+
+    """
+
+    def __init__(self, reader):
+
+        self.reader = reader
+        self.size = reader.trailer['Size']
+        self.objects = {}
+
+    def add(self, value, stream=None, objid=None):
+
+        """
+
+        Arguments:
+            value (Object): the object, a dictionary when it carries a stream
+            stream (Bytes): raw data of the stream, written as it is
+            objid (Int): number of an object of the document to redefine, a new number by default
+
+        Returns:
+            reference (_PDFReference): reference of the object
+
+        """
+
+        if objid is None:
+            objid = self.size
+            self.size += 1
+
+        self.objects[objid] = (value, stream)
+
+        return _PDFReference(objid, 0)
+
+    def copy(self, source, value, copied):
+
+        """
+
+        Copy a value of another document along with every object it references, renumbered into this document.
+
+        Arguments:
+            source (_PDFObjectReader): reader of the other document
+            value (Object): the value to copy
+            copied (Dict): references already copied keyed by their number in the other document, seed it to
+                           redirect references such as the parent of a page
+
+        Returns:
+            value (Object): the value referencing objects of this document
+
+        """
+
+        if isinstance(value, _PDFReference):
+            if value.objid not in copied:
+                objid = self.size
+                self.size += 1
+                copied[value.objid] = _PDFReference(objid, 0)
+
+                obj, offset = source.read_object(value)
+                stream = None if offset is None else source.read(offset, source.resolve(obj['Length']))
+                self.objects[objid] = (self.copy(source, obj, copied), stream)
+
+            return copied[value.objid]
+
+        if isinstance(value, dict):
+            return {key: self.copy(source, item, copied) for key, item in value.items()}
+
+        if isinstance(value, list):
+            return [self.copy(source, item, copied) for item in value]
+
+        return value
+
+    def write(self, fp, **trailer):
+
+        """
+
+        Append the objects, their cross reference table and the trailer to the end of the document.
+
+        Arguments:
+            fp (File Object): the document opened for reading and writing
+            trailer: entries of the trailer besides Size and Prev
+
+        Returns:
+            size (Int): number of bytes appended
+
+        """
+
+        fp.seek(0, 2)
+        start = fp.tell()
+
+        data = bytearray(b'\n')
+        offsets = {}
+
+        for objid in sorted(self.objects):
+            value, stream = self.objects[objid]
+            offsets[objid] = start + len(data)
+
+            if stream is not None:
+                value = dict(value, Length=len(stream))
+
+            data += b'%d 0 obj\n' % objid + _format_pdf_value(value)
+            if stream is not None:
+                data += b'\nstream\r\n' + stream + b'\r\nendstream'
+            data += b'\nendobj\n'
+
+        xref = start + len(data)
+        data += b'xref\n'
+
+        # Consecutive object numbers share a subsection of the table
+        objids = sorted(offsets)
+        first = 0
+        for position in range(1, len(objids) + 1):
+            if position == len(objids) or objids[position] != objids[position - 1] + 1:
+                data += b'%d %d\n' % (objids[first], position - first)
+                for objid in objids[first:position]:
+                    data += b'%010d 00000 n\r\n' % offsets[objid]
+                first = position
+
+        trailer = dict(trailer, Size=self.size, Prev=self.reader.startxref)
+        data += b'trailer\n' + _format_pdf_value(trailer) + b'\nstartxref\n%d\n%%%%EOF\n' % xref
+
+        fp.write(data)
+
+        return len(data)
+
+class MolPDFParser(object):
+
+    """
+
+    Reads the SMILES metadata of a MolPDF document. The trailer is followed straight to the info dictionary
+    (and the indexed SMILES stream) without parsing the rest of the file, pdfminer is only used as a fallback
+    for documents rewritten by other tools. Files are opened per call, or once for the whole block when the
+    parser is used as a context manager.
+
+    The manifest of a sharded report (name.manifest.json) reads like a single document, every call is handed
+    to the shard holding the molecules.
+
+    """
+
+    __version__ = '0.2.0'
+
+    def __init__ (self, file_path):
+
+        self.file_path = file_path
+        self.molpdf = None
+        self._reader = None
+        self._document = None
+        self.manifest = None
+
+        if str(file_path).endswith(_manifest_suffix):
+            with open(file_path) as f:
+                self.manifest = json.load(f)
+
+    def __enter__(self):
+
+        if self.manifest is None:
+            self.molpdf = open(self.file_path, 'rb')
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def close(self):
+
+        """
+
+        Close the file handle held by the parser.
+
+        """
+
+        if self.molpdf is not None:
+            self.molpdf.close()
+
+        self.molpdf = None
+        self._reader = None
+        self._document = None
+
+    @property
+    def document(self):
+
+        """
+
+        Returns:
+            document (pdfminer PDFDocument Object): the whole document parsed by pdfminer, built on first access
+                                                    and kept until close() is called.
+
+        """
+
+        if self._document is None:
+            if self.molpdf is None:
+                self.molpdf = open(self.file_path, 'rb')
+            self._document = PDFDocument(PDFParser(self.molpdf))
+
+        return self._document
+
+    def resolve(self, index):
+
+        """
+
+        Find the shard holding a molecule of a sharded report.
+
+        Arguments:
+            index (Int): position of the molecule in the whole report
+
+        Returns:
+            shard (Tuple): path of the shard and position of the molecule in it, a document that is not sharded
+                           is its own shard
+
+        """
+
+        if self.manifest is None:
+            return self.file_path, index
+
+        count = self.manifest['count']
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('SMILES index out of range')
+
+        shards = self.manifest['shards']
+        shard = shards[bisect_right([shard['start'] for shard in shards], index) - 1]
+
+        return self._shard_path(shard), index - shard['start']
+
+    def _shard_path(self, shard):
+
+        # Shards are listed relative to the manifest
+        return os.path.join(os.path.dirname(self.file_path), shard['file'])
+
+    @contextmanager
+    def _source(self):
+
+        """
+
+        Yields:
+            info (Dict): the info dictionary of the document
+            resolve (Function): resolves indirect objects of the info dictionary
+            read_stream (Function): returns the stream dictionary and a function reading a byte range of its raw data
+
+        """
+
+        close = self.molpdf is None
+        if close:
+            self.molpdf = open(self.file_path, 'rb')
+
+        try:
+            if self._document is None:
+                try:
+                    if self._reader is None:
+                        self._reader = _PDFObjectReader(self.molpdf)
+                    reader = self._reader
+                    info = reader.resolve(reader.trailer.get('Info')) or {}
+                except (_FastPathError, ValueError, IndexError):
+                    reader = None
+            else:
+                reader = None
+
+            if reader is not None:
+
+                def read_stream(reference):
+                    dictionary, offset = reader.read_object(reference)
+                    return dictionary, lambda start, stop: reader.read(offset + start, stop - start)
+
+                yield info, reader.resolve, read_stream
+
+            else:
+
+                def read_stream(reference):
+                    stream = resolve1(reference)
+                    content = stream.get_rawdata()
+                    return stream.attrs, lambda start, stop: content[start:stop]
+
+                yield self.document.info[0], resolve1, read_stream
+        finally:
+            if close:
+                self.close()
+
+    def extract_smiles(self):
+
+        """
+
+        Extract the smiles data coming out the PDF
+
+        Returns:
+            smiles_list (List): List of SMILES strings from the metadata of the PDF
+
+
+        """
+
+        if self.manifest is not None:
+            smiles_list = []
+            for shard in self.manifest['shards']:
+                smiles_list.extend(MolPDFParser(self._shard_path(shard)).extract_smiles())
+            return smiles_list
+
+        with self._source() as (info, resolve, read_stream):
+
+            if info.get('smiles_stream') is None:
+                return [_decode_smiles(smiles) for smiles in resolve(info['smiles_list'])]
+
+            stream, read = read_stream(info['smiles_stream'])
+            offsets = resolve(stream['Offsets'])
+
+            smiles_list = []
+            for block in range(len(offsets) - 1):
+                smiles_list.extend(_decompress_smiles_block(read, offsets, block))
+
+        return smiles_list
+
+    def extract_smiles_at(self, index):
+
+        """
+
+        Extract a single SMILES, only its block of the indexed SMILES stream is read and decompressed.
+
+        Arguments:
+            index (Int): position of the molecule in the SMILES list of the document
+
+        Returns:
+            smiles (String): SMILES string of the molecule
+
+        """
+
+        if self.manifest is not None:
+            file_path, index = self.resolve(index)
+            return MolPDFParser(file_path).extract_smiles_at(index)
+
+        with self._source() as (info, resolve, read_stream):
+
+            if info.get('smiles_stream') is None:
+                return _decode_smiles(resolve(info['smiles_list'])[index])
+
+            stream, read = read_stream(info['smiles_stream'])
+
+            count = stream['Count']
+            if index < 0:
+                index += count
+            if not 0 <= index < count:
+                raise IndexError('SMILES index out of range')
+
+            block_size = stream['BlockSize']
+            block = _decompress_smiles_block(read, resolve(stream['Offsets']), index // block_size)
+
+        return block[index % block_size]
+
+    def extract_page_smiles(self, page):
+
+        """
+
+        Extract the SMILES of the molecules drawn on one page, requires the indexed SMILES stream.
+
+        Arguments:
+            page (Int): page number starting at 1
+
+        Returns:
+            smiles_list (List): SMILES strings of the molecules on the page
+
+        """
+
+        if self.manifest is not None:
+            for shard in self.manifest['shards']:
+                if page <= shard['pages']:
+                    return MolPDFParser(self._shard_path(shard)).extract_page_smiles(page)
+                page -= shard['pages']
+            return []
+
+        with self._source() as (info, resolve, read_stream):
+
+            if info.get('smiles_stream') is None:
+                raise ValueError('%s was generated without smiles_index, pages can not be resolved' % self.file_path)
+
+            stream, read = read_stream(info['smiles_stream'])
+
+            count = stream['Count']
+            pages = list(resolve(stream['Pages'])) + [count]
+
+            if page < 1 or page > len(pages):
+                return []
+
+            start, stop = pages[page - 1], pages[page] if page < len(pages) else count
+
+            if stop <= start:
+                return []
+
+            block_size = stream['BlockSize']
+            offsets = resolve(stream['Offsets'])
+
+            smiles_list = []
+            for block in range(start // block_size, (stop - 1) // block_size + 1):
+                smiles_list.extend(_decompress_smiles_block(read, offsets, block))
+
+        first = (start // block_size) * block_size
+
+        return smiles_list[start - first:stop - first]
+
+def _extract_smiles(file_path):
+
+    """
+
+    Extract the SMILES of one document, module level so it can run inside a process pool.
+
+    """
+
+    return MolPDFParser(file_path).extract_smiles()
+
+class MolPDFBatchParser(object):
+
+    """
+
+    Extract the SMILES of many MolPDF documents concurrently, results are yielded as the documents finish.
+
+    """
+
+    __version__ = '0.1.0'
+
+    def __init__ (self, file_paths):
+
+        """
+
+        Arguments:
+            file_paths (List or String): paths of the documents or a glob pattern such as 'archive/**/*.pdf'
+
+        """
+
+        if isinstance(file_paths, str):
+            file_paths = glob.iglob(file_paths, recursive=True)
+
+        self.file_paths = file_paths
+        self.errors = {}
+
+    def extract_smiles(self, workers=8, processes=False):
+
+        """
+
+        Arguments:
+            workers (Int): number of documents read at the same time
+            processes (Bool): read the documents in a process pool rather than a thread pool
+
+        Yields:
+            result (Tuple): (path, smiles_list) in completion order, smiles_list is None when the document
+                            failed and the exception is kept in MolPDFBatchParser.errors under its path
+
+        """
+
+        if not isinstance(workers, int) or workers < 1:
+            print ('Please provide a positive number of workers into MolPDFBatchParser')
+            raise ValueError
+
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        file_paths = iter(self.file_paths)
+
+        with executor_class(max_workers=workers) as executor:
+
+            # Keep a bounded number of documents in flight so huge archives are never queued all at once
+            pending = {}
+
+            for file_path in islice(file_paths, workers * 4):
+                pending[executor.submit(_extract_smiles, file_path)] = file_path
+
+            while pending:
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+
+                    file_path = pending.pop(future)
+
+                    for next_path in islice(file_paths, 1):
+                        pending[executor.submit(_extract_smiles, next_path)] = next_path
+
+                    try:
+                        smiles_list = future.result()
+                    except Exception as e:
+                        self.errors[file_path] = e
+                        smiles_list = None
+
+                    yield file_path, smiles_list
+
+def _decode_smiles(smiles):
+
+    """
+
+    SMILES in the info dictionary come back as bytes, documents written by older versions as PDF keywords.
+
+    """
+
+    smiles = getattr(smiles, 'name', smiles)
+
+    if isinstance(smiles, bytes):
+        return smiles.decode('utf-8')
+
+    return smiles
+
+class _MolPDFInfo(PDFInfo):
+
+    """
+
+    Info dictionary of the document carrying the SMILES list, written by reportlab when the canvas is saved
+    so the finished PDF never has to be read back in.
+
+    """
+
+    def __init__(self, info, smiles_list):
+        PDFInfo.__init__(self)
+        self.__dict__.update(info.__dict__)
+        self.smiles_list = smiles_list
+        self.smiles_stream = None
+
+    def format(self, document):
+        # PDFInfo formats a fixed set of keys, splice the SMILES entry into its dictionary
+        info = PDFInfo.format(self, document)
+
+        if self.smiles_stream is not None:
+            entries = {'smiles_stream': self.smiles_stream}
+        else:
+            entries = {'smiles_list': PDFArray([PDFString(smiles) for smiles in self.smiles_list])}
+
+        entries = PDFDictionary(entries).format(document)
+
+        return info[:info.rindex(b'>>')] + entries[entries.index(b'<<') + 2:]
+
+class _MolPDFCanvas(canvas.Canvas):
+
+    """
+
+    Canvas of a MolPDF document, embeds the SMILES metadata as the document is saved.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        self.smiles_list = kwargs.pop('smiles_list')
+        self.smiles_pages = kwargs.pop('smiles_pages', [])
+        self.smiles_index = kwargs.pop('smiles_index', False)
+        self.stats = kwargs.pop('stats', None) or MolPDFStats()
+
+        canvas.Canvas.__init__(self, *args, **kwargs)
+
+        self._doc.info = _MolPDFInfo(self._doc.info, self.smiles_list)
+
+    def save(self):
+
+        with self.stats.stage('metadata'):
+            if self.smiles_index:
+                content, offsets = _compress_smiles_blocks(self.smiles_list)
+                dictionary = PDFDictionary({
+                    'Type': PDFName('MolPDFSmiles'),
+                    'Count': len(self.smiles_list),
+                    'BlockSize': _smiles_block_size,
+                    'Offsets': PDFArray(offsets),
+                    'Pages': PDFArray(self.smiles_pages),
+                })
+                # The blocks are compressed on their own, the stream itself is stored raw for random access
+                stream = PDFStream(dictionary, content, filters=[])
+                self._doc.info.smiles_stream = self._doc.Reference(stream)
+
+        # Reportlab writes the document in one go into a file object, files it opens itself are measured later
+        if not isinstance(self._filename, str):
+            self._filename = _CountingWriter(self._filename, self.stats)
+
+        with self.stats.stage('write'):
+            canvas.Canvas.save(self)
+
+class _CountingWriter(object):
+
+    """
+
+    File object forwarding the writes of reportlab while counting the bytes written into the stats.
+
+    """
+
+    def __init__(self, fp, stats):
+        self._fp = fp
+        self._stats = stats
+        self.name = getattr(fp, 'name', '')
+
+    def write(self, data):
+        self._stats.bytes_written += len(data)
+        return self._fp.write(data)
+
+class _MoleculeTable(Table):
+
+    """
+
+    Table of molecules remembering the index of the first molecule of every row, the parts reportlab splits it
+    into across pages keep their own rows so the page index of the SMILES stays exact.
+
+    """
+
+    def __init__(self, data, row_indices=None, **kwargs):
+        Table.__init__(self, data, **kwargs)
+        self._row_indices = row_indices or []
+
+    @property
+    def _molpdf_index(self):
+        return self._row_indices[0] if self._row_indices else None
+
+    def split(self, availWidth, availHeight):
+        parts = Table.split(self, availWidth, availHeight)
+        offset = 0
+        for part in parts:
+            if part is not self:
+                part._row_indices = self._row_indices[offset:offset + part._nrows]
+            offset += part._nrows
+        return parts
+
+class _StreamingStory(list):
+
+    """
+
+    Story handed to reportlab's doc.build that refills itself from a generator of flowables as the build
+    consumes it, so only a couple of chunks of flowables wait to be laid out at any time. The pages already
+    drawn stay in reportlab's document until it is saved.
+
+    """
+
+    def __init__(self, flowables, stream, low_water=2):
+        list.__init__(self, flowables)
+        self._stream = stream
+        self._low_water = low_water
+
+    def __len__(self):
+        while self._stream is not None and list.__len__(self) < self._low_water:
+            flowables = next(self._stream, None)
+            if flowables is None:
+                self._stream = None
+            else:
+                self.extend(flowables)
+        return list.__len__(self)
+
+class MolPDF(object):
+
+    __version__ = '0.1.0'
+
+    # Stylesheet and table styles shared by every document of the process
+    _styles = None
+    _table_styles = None
+
+    def __init__ (self, name = 'molecules.pdf', columns=8, cell_width=0.85 * inch, image_size=0.5 * inch,
+                  show_smiles=True):
+
+        """
+
+        Arguments:
+            name (String or File Object): name of the pdf file that they want to produce, or a binary file object
+                                          the PDF is written to
+            columns (Int): number of molecules per row of the tables
+            cell_width (Float): width of a table column in points
+            image_size (Float): width and height of a molecule image in points
+            show_smiles (Bool): whether to print the SMILES row underneath the images
+
+
+        """
+
+        if not isinstance(name, str) and not callable(getattr(name, 'write', None)):
+            print ('Please provide a file name or a binary file object into MolPDF')
+            raise TypeError
+
+        if not isinstance(columns, int) or columns < 1:
+            print ('Please provide a positive number of columns into MolPDF')
+            raise ValueError
+
+        self.name = name
+        self.columns = columns
+        self.cell_width = cell_width
+        self.image_size = image_size
+        self.show_smiles = show_smiles
+        self.doc = self._intialize_doc_template()
+        self.story = []
+        self.temp_dir_name = ''
+        self.smiles = []
+        self.smiles_pages = []
+        self.errors = []
+        self.styles = self._set_reportlab_styles()
+        self.table_style_with_background, self.table_style_without_background = self._set_table_styles()
+        self.frame = self._create_frame()
+        self.page_template = self._create_page_template()
+        self.doc.addPageTemplates([self.page_template])
+
+    def _intialize_doc_template(self):
+
+        """
+
+        Arguments:
+            self (MolPDF Class Object): Instance of the MolPDF class
+
+        Return:
+            doc (ReportLab BaseDocTemplate Object): The initialized doc template from reportlab
+
+        """
+
+        # Initiate the template with the base rather than simple to install the header/footer
+        doc = BaseDocTemplate(self.name, rightMargin=.1 * inch, leftMargin=.1 * inch,
+                              topMargin=0.1 * inch, bottomMargin=1.5 * inch)
+        doc.afterFlowable = self._after_flowable
+
+        return doc
+
+    def _set_reportlab_styles(self):
+
+        """
+        Set the base stylings of the reportlab
+        ​
+        Returns:
+            styles (Object): styles object with predefined styles to be used in the report. (Makes it easier a long the way).
+        ​
+        """
+
+        # The stylesheet is built once and shared by every document
+        if MolPDF._styles is not None:
+            return MolPDF._styles
+
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(name='Center', alignment=TA_CENTER))
+        styles.add(ParagraphStyle(name='Right', alignment=TA_RIGHT))
+        styles.add(ParagraphStyle(name='Left', alignment=TA_LEFT))
+        styles.add(ParagraphStyle(name='Line_Data', alignment=TA_LEFT, fontSize=8, leading=7))
+        styles.add(ParagraphStyle(name='Line_Data_Small', alignment=TA_LEFT, fontSize=7, leading=8))
+        styles.add(ParagraphStyle(name='Line_Label_Large', alignment=TA_CENTER, fontSize=12, leading=12))
+        styles.add(ParagraphStyle(name='Line_Data_Largest', alignment=TA_LEFT, fontSize=14, leading=15))
+        styles.add(ParagraphStyle(name='Line_Label', font='Helvetica-Bold', fontSize=7, leading=6, alignment=TA_LEFT))
+        styles.add(ParagraphStyle(name='Line_Label_Spacing', font='Helvetica-Bold', fontSize=7, leading=10, alignment=TA_LEFT))
+        styles.add(ParagraphStyle(name='Line_Label_Center', font='Roboto', fontSize=5, alignment=TA_CENTER))
+        styles.add(ParagraphStyle(name='Line_Label_Center_Big', font='Helvetica-Bold', fontSize=9, alignment=TA_CENTER))
+
+        MolPDF._styles = styles
+
+        return styles
+
+    def _set_table_styles(self):
+
+        """
+
+        Return default table styles that we can use downstream for reports, will have to append as needed.
+        ​
+        Returns:
+            table_style_with_background (Object): Table style with the background of light grey
+            table_style_without_background (Object): Table style with the background as white.
+        """
+
+        if MolPDF._table_styles is not None:
+            return MolPDF._table_styles
+
+        table_style_with_background = TableStyle([
+            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.lightblue),
+            ('BOX', (0, 0), (-1, -1), 0.25, colors.lightblue),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN',(0,0),(-1,-1),'CENTER'),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.lightsalmon),
+        ])
+
+        table_style_without_background =TableStyle([
+            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.lightblue),
+            ('BOX', (0, 0), (-1, -1), 0.25, colors.lightblue),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN',(0,0),(-1,-1),'CENTER'),
+        ])
+
+        MolPDF._table_styles = table_style_with_background, table_style_without_background
+
+        return MolPDF._table_styles
+
+    def _create_frame(self):
+
+        """
+
+        Create the Frame for each page
+
+        Returns:
+             frame (ReportLab Frame Object): Frame of the page to prepare the canvas
+        """
+
+        frame = Frame(self.doc.leftMargin, self.doc.bottomMargin, self.doc.width, self.doc.height-0.75*inch,
+                      id='footer-frame')
+
+        return frame
+
+    def _create_page_template(self):
+
+        """
+
+        Return:
+            page_template (ReportLab PageTemplate Object): Set the page template
+
+
+        """
+
+        page_template = PageTemplate(id='footer-frame', frames=self.frame, onPage=partial(self._footer, styles = self.styles))
+
+        return page_template
+
+    def add_spacer(self):
+
+        """
+
+        Add a spacer between objects. Appends to the story
+
+        """
+
+        self.story.append(Spacer(0.1 * inch, .3 * inch))
+
+    def _header(self, canvas, doc, styles):
+        """
+        Draws the header on a canvas.
+
+        Arguments:
+            canvas (Canvas Object): Canvas to draw the header on
+            doc (ReportLab Object): Report lab document stemming from the BaseDocTemplate
+
+        """
+        # Save the previous state
+        canvas.saveState()
+
+        header_text = ''
+
+        header_text = Paragraph("<b></b> <br />" + header_text, styles["Right"])
+
+        # Wrap the content in
+        width, height = header_text.wrap(doc.width, doc.topMargin)
+        draw_from = doc.height + doc.topMargin + height
+
+        header_text.drawOn(canvas, doc.leftMargin, draw_from)
+        canvas.setLineWidth(0.9)
+        canvas.setStrokeColor(colors.teal)
+        canvas.line(3,draw_from-3,600,draw_from-3)
+
+        # Restore the canvas state
+        canvas.restoreState()
+
+    def _footer(self, canvas, doc, styles):
+
+        """
+
+        Draw the footer
+        ​
+        Arguments:
+            canvas (Canvas Object): Canvas to draw the footer on
+            doc (ReportLab Object): Report lab document stemming from the BaseDocTemplate
+            styles (Reportlab Styles Object): sample sheet styling object coming from Reportlab
+        ​
+        """
+        #
+        # Save the previous state
+        canvas.saveState()
+
+        footer_text = ''
+
+        footer_text = Paragraph(footer_text, self.styles["Center"])
+
+        # Wrap the content in
+        footer_text.wrap(self.doc.width, self.doc.topMargin)
+        draw_from = self.doc.topMargin
+        footer_text.drawOn(canvas, self.doc.leftMargin, draw_from)
+
+        # Restore the canvas state
+        canvas.restoreState()
+
+    def add_title(self, title):
+
+        """
+
+        Add a big title to the center of the page
+
+        Arguments:
+            title (String): title they would like on the page
+
+
+        """
+
+        title = Paragraph(title, self.styles['Line_Label_Center_Big'])
+        self.story.append(title)
+
+    def add_image(self, temporary_directory, include_failed_smiles=False, workers=1, render_format='png',
+                  cache=None, chunk_size=64, deduplicate=False, timeout=None, renderer=None, coordinates=None,
+                  scaffold=None):
+
+        """
+
+        Arguments:
+            temporary_directory (tempfile object): Temporary directory of the module, None renders the images in memory
+            include_failed_smiles (Bool): whether failed molecules keep a placeholder cell, they go to self.errors.
+            workers (Int): number of processes used to render the molecules, 1 renders in the current process.
+            render_format (String): 'png' for raster images or 'pdf' for vector drawings.
+            cache (MolRenderCache Object): cache of rendered molecules, hits and misses are counted on it.
+            chunk_size (Int): number of molecules rendered and laid out at a time, rounded up to whole rows.
+            deduplicate (Bool): render each canonical structure once and reuse its image for every occurrence.
+            timeout (Float): seconds after which the layout of a single molecule is cancelled.
+            renderer (MolRenderer Object): shared session rendering the molecules when there are no workers.
+            coordinates (MolCoordinateCache Object): cache of the 2D coordinates of laid out molecules.
+            scaffold (String): SMILES or SMARTS of a core highlighted and aligned in every molecule.
+
+        """
+
+        self.errors = []
+
+        for chemical_data in self._render_chunks(self.smiles, self.labels, temporary_directory, include_failed_smiles,
+                                                 workers, render_format, cache, chunk_size, deduplicate, timeout,
+                                                 renderer, coordinates, scaffold):
+            self.add_table(chemical_data)
+
+    def _render_chunks(self, smiles, labels, temporary_directory, include_failed_smiles=False, workers=1,
+                       render_format='png', cache=None, chunk_size=64, deduplicate=False, timeout=None, renderer=None,
+                       coordinates=None, scaffold=None, stats=None):
+
+        """
+
+        Lazily render the SMILES a chunk at a time so only a couple of chunks are held in memory.
+
+        Arguments:
+            smiles (Iterable): SMILES strings, can be a generator
+            labels (Iterable): labels matching the SMILES, can be shorter or empty
+            deduplicate (Bool): render every canonical structure once and share its image between the occurrences
+            timeout (Float): seconds after which the layout of a single molecule is cancelled and reported as failed
+            renderer (MolRenderer Object): session rendering the molecules when there are no workers
+            coordinates (MolCoordinateCache Object): cache of the 2D coordinates of laid out molecules
+            scaffold (String): SMILES or SMARTS of a core highlighted and aligned in every molecule
+            stats (MolPDFStats Object): timings and counters of the report
+
+        Yields:
+            chemical_data (List): List of objects for the image, smiles, label and position of the SMILES in the input
+                                  [[image1, smiles1, label1, 0], ...], the image is None for a failed molecule
+
+        """
+
+        smiles = enumerate(smiles)
+        labels = iter(labels)
+        stats = stats or MolPDFStats()
+
+        # Every chunk is laid out as its own table, whole rows keep a short row from showing up between chunks
+        chunk_size = -(-max(chunk_size, 1) // self.columns) * self.columns
+
+        session = renderer or MolRenderer()
+        session.set_options(_timeout_option(timeout))
+
+        executor = None
+
+        if workers > 1:
+            # Each worker holds its own Indigo session, map keeps the input order of the SMILES
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_initialize_render_worker,
+                                           initargs=(timeout, cache, coordinates))
+            render = partial(_render_molecule_worker, temporary_directory=temporary_directory,
+                             render_format=render_format, scaffold=scaffold)
+        else:
+            render = partial(_render_molecule, session, temporary_directory=temporary_directory,
+                             render_format=render_format, cache=cache, coordinates=coordinates, scaffold=scaffold)
+
+        # Canonical SMILES of every structure scheduled so far mapped to its rendered image and error, in memory
+        # images wait in the image store until the structure shows up again
+        rendered = {}
+        stored = _ImageStore() if deduplicate else None
+        canonicalizer = session.indigo
+
+        def canonical(smiles_string):
+            try:
+                # Kekule and aromatic spellings of a ring end up as the same structure
+                molecule, _ = _load_molecule(canonicalizer, smiles_string)
+                molecule.aromatize()
+                return molecule.canonicalSmiles(), None
+            except IndigoException as e:
+                return None, ('load', _error_message(e))
+
+        def submit(chunk):
+            if deduplicate:
+                with stats.stage('deduplicate'):
+                    keys = [canonical(smiles_string) for _, smiles_string in chunk]
+                unique = []
+                for (key, _), (_, smiles_string) in zip(keys, chunk):
+                    if key is not None and key not in rendered:
+                        rendered[key] = None
+                        unique.append((key, smiles_string))
+                return keys, [key for key, _ in unique], submit_renders(unique)
+            return None, None, submit_renders(chunk)
+
+        def submit_renders(chunk):
+            if executor is None:
+                return map(render, (smiles_string for _, smiles_string in chunk))
+            return executor.map(render, [smiles_string for _, smiles_string in chunk],
+                                chunksize=max(1, len(chunk) // (workers * 4)))
+
+        def count(cached):
+            if cache is not None:
+                if cached:
+                    cache.hits += 1
+                    stats.cache_hits += 1
+                else:
+                    cache.misses += 1
+                    stats.cache_misses += 1
+
+        def flowable(image):
+            if render_format == 'pdf':
+                return flowable_vector(image, self.image_size, self.image_size)
+
+            # In memory renders are handed to reportlab as a buffer rather than a path
+            if isinstance(image, bytes):
+                image = BytesIO(image)
+
+            return Image(image, self.image_size, self.image_size, hAlign='CENTER')
+
+        def resolve(keys, scheduled, images):
+
+            if keys is None:
+                for image, cached, error in images:
+                    count(cached)
+                    yield image, error
+                return
+
+            # The first occurrence renders the structure, the drawing of a vector image is parsed once so every
+            # occurrence shares the same form XObject, paths and png bytes are deduplicated by reportlab itself
+            for key, (image, cached, error) in zip(scheduled, images):
+                count(cached)
+                if image is not None and render_format == 'pdf':
+                    image = pagexobj(PdfReader(fdata=image).pages[0])
+                elif isinstance(image, bytes):
+                    image = stored.append(image)
+                rendered[key] = image, error
+
+            for key, error in keys:
+                if key is None:
+                    yield None, error
+                    continue
+                image, error = rendered[key]
+                yield (stored[image] if isinstance(image, int) else image), error
+
+        try:
+            chunk = list(islice(smiles, chunk_size))
+            with stats.stage('render'):
+                images = submit(chunk)
+
+            while chunk:
+
+                # The workers render the next chunk while the current one is laid out
+                next_chunk = list(islice(smiles, chunk_size))
+                with stats.stage('render'):
+                    next_images = submit(next_chunk) if next_chunk else None
+                    images = list(resolve(*images))
+
+                chemical_data = []
+
+                with stats.stage('table'):
+                    for (index, smiles_string), (image, error) in zip(chunk, images):
+
+                        label = next(labels, None)
+
+                        # A failed molecule is reported and skipped, or kept as a placeholder cell
+                        if image is None:
+                            self._record_error(index, smiles_string, label, error, stats)
+                            if include_failed_smiles:
+                                chemical_data.append([None, smiles_string, label, index])
+                            continue
+
+                        chemical_data.append([flowable(image), smiles_string, label, index])
+
+                yield chemical_data
+
+                chunk, images = next_chunk, next_images
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if stored is not None:
+                stored.close()
+
+    def _create_temp_directory(self):
+
+        """
+
+        Prepare a temporary directory to render the molecule images.
+
+        Creates:
+            tmp (directory): a new directory in the system temporary directory, unique even when reports are
+                             generated at the same time by many processes or threads.
+
+        """
+
+        return tempfile.mkdtemp(prefix='.molpdf-')
+
+
+    def _destroy_temp_directory(self, tmp):
+
+        """
+
+        Destroys the temporary directory as a part of cleanup
+
+        """
+
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    def _add_table_label(self, smiles):
+
+        """
+
+        Generate the table header - pretty simple for now and keeping with molecule 2D images and the SMILES.
+
+
+        """
+
+        overview_information = [[
+            Paragraph('%s' % smiles, self.styles["Line_Label_Center"]),
+        ]]
+
+        overview_table = Table(overview_information, colWidths=(1.5 * inch))
+        overview_table.setStyle(self.table_style_with_background)
+        self.story.append(overview_table)
+
+    def add_table(self, chemical_data):
+
+        """
+
+        Adds a row of the 2D image of a molecule and then the SMILES as one row.
+
+        Arguments
+            chemical_data (List): List of objects for the image, smiles, label and index [[image1, smiles1, label1, 0], ...]
+
+        """
+
+        self.story.extend(self._build_tables(chemical_data))
+        self.add_spacer()
+
+    def _cell_text(self, text):
+
+        """
+
+        Paragraph of a SMILES or label cell, cut short so the cell keeps a bounded height and escaped so the
+        text is never read as paragraph markup.
+
+        """
+
+        style = self.styles["Line_Label_Center"]
+        width = self.cell_width - 12
+
+        # Text this short fits the cell even if every line breaks half way, only longer text is measured
+        fits = int(width // style.fontSize) * int(_cell_text_height // style.leading) // 2
+
+        if len(text) > _cell_text_length:
+            text = text[:_cell_text_length - 3] + '...'
+
+        paragraph = Paragraph(escape(text), style)
+
+        # Narrow cells fit fewer characters a line, the text is halved until it fits the cell
+        while len(text) > max(fits, 6) and paragraph.wrap(width, 2 * _cell_text_height)[1] > _cell_text_height:
+            text = text[:(len(text) - 3) // 2] + '...'
+            paragraph = Paragraph(escape(text), style)
+
+        return paragraph
+
+    def _build_tables(self, chemical_data):
+
+        """
+
+        Lay out a chunk of molecules as a single table, every group of columns gets a row of images followed by
+        a row of SMILES and a row of labels. Groups are never split across pages.
+
+        Arguments
+            chemical_data (List): List of objects for the image, smiles, label and index [[image1, smiles1, label1, 0], ...]
+
+        Returns:
+            flowables (List): the table of the images, SMILES and labels ready for the story
+
+        """
+
+        if not chemical_data:
+            return []
+
+        has_labels = any(data[2] is not None for data in chemical_data)
+        rows_per_group = 1 + int(self.show_smiles) + int(has_labels)
+
+        rows = []
+        row_indices = []
+        style = []
+
+        for start in range(0, len(chemical_data), self.columns):
+
+            group = chemical_data[start:start + self.columns]
+            padding = [''] * (self.columns - len(group))
+
+            style.append(('NOSPLIT', (0, len(rows)), (-1, len(rows) + rows_per_group - 1)))
+
+            # Molecules that failed to render keep their cell with a highlighted placeholder
+            for column, data in enumerate(group):
+                if data[0] is None:
+                    style.append(('BACKGROUND', (column, len(rows)), (column, len(rows)), colors.lightsalmon))
+
+            rows.append([data[0] or Paragraph('Failed Rendering', self.styles["Line_Label_Center"]) for data in group]
+                        + padding)
+
+            if self.show_smiles:
+                rows.append([self._cell_text(data[1]) for data in group] + padding)
+
+            if has_labels:
+                rows.append([self._cell_text(data[2] or '') for data in group] + padding)
+
+            row_indices.extend([group[0][3]] * rows_per_group)
+
+        table = _MoleculeTable(rows, row_indices=row_indices, colWidths=[self.cell_width] * self.columns)
+        table.setStyle(self.table_style_without_background)
+        table.setStyle(TableStyle(style))
 
-    return timed
+        return [table]
 
-class RaiseMoleculeError(Exception):
+    def generate(self, smiles, labels=[], include_failed_smiles=False, workers=1, in_memory=None,
+                 render_format='png', cache=None, chunk_size=64, smiles_index=False, grid=False, deduplicate=False,
+                 timeout=None, callback=None, output=None, renderer=None, shard_size=None, shard_workers=1,
+                 merge=False, coordinates=None, scaffold=None):
 
-    __version_error_parser__ = "1.1.0"
-    __allow_update__ = False
 
-    """
+        """
 
-    Raise Molecule Error if for some reason we can't evaluate a SMILES, 2D, or 3D molecule.
+        Build the story and generate the final pdf, the molecules are rendered and laid out a chunk at a time
+        so the smiles can be streamed from a generator. Reportlab keeps every page in memory until the pdf is
+        written, shard_size bounds the memory taken by huge libraries.
 
-    """
-    def __init__(self, message, errors):
-        super().__init__(message)
-        self.errors = errors
+        Arguments:
+            smiles (Iterable): List or generator of smiles you would like to pass in
+            labels (Iterable): List or generator of labels that might need to be added based on the user.
+            include_failed_smiles (Bool): Keep a placeholder cell for the molecules that failed to render, they are
+                                          listed in self.errors either way.
+            workers (Int): Number of processes used to render the molecules.
+            in_memory (Bool): Render the images into memory instead of png files in a temporary directory, by
+                              default only reports written to a path go through the temporary directory.
+            render_format (String): 'png' rasterizes the molecules, 'pdf' draws them as vector graphics.
+            cache (MolRenderCache Object): Reuse images of molecules rendered by previous reports.
+            chunk_size (Int): Number of molecules rendered and laid out at a time, rounded up to whole rows.
+            smiles_index (Bool): Store the SMILES in a compressed, indexed stream that MolPDFParser can read
+                                 a page or a single molecule at a time.
+            grid (Bool): Render every chunk of molecules (at most a page) as a single grid image with the SMILES
+                         and labels drawn by Indigo, rather than one image and table cell per molecule.
+            deduplicate (Bool): Canonicalize the SMILES and render every unique structure once, repeated structures
+                                share one image in the PDF. Grids are always drawn whole and ignore it.
+            timeout (Float): Seconds after which Indigo cancels the layout of a single molecule, the molecule is then
+                             reported as failed instead of holding up the report.
+            callback (Callable): Called with the MolPDFStats of the report once it is written, to forward the
+                                 timings and counters to a logger or a metrics system.
+            output (String or File Object): Path or binary file object the report is written to instead of the
+                                            name of the document, e.g. a BytesIO or an HTTP response stream.
+            renderer (MolRenderer Object): Long lived session rendering the molecules when there are no workers,
+                                           share one between reports to skip setting up Indigo every time.
+            shard_size (Int): Split the report into documents of shard_size molecules named name-00000.pdf,
+                              name-00001.pdf, ... each with its own SMILES metadata, and list them in
+                              name.manifest.json that MolPDFParser reads like a single document.
+            shard_workers (Int): Number of processes building shards at the same time.
+            merge (Bool): Join the pages of the shards into name once they are built, nothing is rendered again.
+            coordinates (MolCoordinateCache Object): Keep the 2D coordinates of every laid out molecule, later
+                                                     reports reuse them instead of laying the molecule out again.
+                                                     Molecules whose input carries 2D coordinates are never laid out.
+            scaffold (String): SMILES or SMARTS of the common core of a series, it is highlighted in every molecule
+                               and the molecules are turned to share its orientation. The query is compiled once
+                               per process and the molecules are matched in the render workers.
 
-class flowable_fig(Flowable):
+        Returns:
+            stats (MolPDFStats Object): per stage timings and counters of the report, the stats of the shards added
+                                        together for a sharded report.
 
-    def __init__(self, imgdata):
-        Flowable.__init__(self)
-        self.img = ImageReader(imgdata)
+        """
 
-    def draw(self):
-        self.canv.drawImage(self.img, 0, 0, height = -2*inch, width=4*inch)
+        if not isinstance(workers, int) or workers < 1:
+            print ('Please provide a positive number of workers into MolPDF')
+            raise ValueError
 
+        if render_format not in ('png', 'pdf'):
+            print ('Please provide a render format of png or pdf into MolPDF')
+            raise ValueError
 
-class MolPDFParser(object):
+        # The scaffold is compiled up front so a bad query fails the report rather than every molecule
+        if scaffold is not None:
+            renderer = renderer or MolRenderer()
+            try:
+                renderer.scaffold(scaffold)
+            except IndigoException:
+                print ('Please provide a scaffold SMILES or SMARTS that Indigo can read into MolPDF')
+                raise ValueError
 
-    __version__ = '0.1.0'
+        self.labels = labels
+        self.smiles = _SmilesStore()
+        self.smiles_pages = []
+        self.errors = []
 
-    def __init__ (self, file_path):
+        stats = MolPDFStats()
 
-        self.file_path = file_path
-        self.molpdf = open(self.file_path, 'rb')
-        self.parser = PDFParser(self.molpdf)
-        self.document = PDFDocument(self.parser)
+        output = self.name if output is None else output
 
+        if shard_size is not None:
+            options = dict(include_failed_smiles=include_failed_smiles, workers=workers, in_memory=in_memory,
+                           render_format=render_format, cache=cache, chunk_size=chunk_size,
+                           smiles_index=smiles_index, grid=grid, deduplicate=deduplicate, timeout=timeout,
+                           coordinates=coordinates, scaffold=scaffold)
+            self._generate_shards(smiles, labels, output, shard_size, shard_workers, merge, options, stats)
 
-    def extract_smiles(self):
+            if callback is not None:
+                callback(stats)
 
-        """
+            return stats
 
-        Extract the smiles data coming out the PDF
+        # Reports written to a file object or returned as bytes never touch the disk, vector drawings are always
+        # kept in memory as they are embedded as form XObjects
+        if in_memory is None:
+            in_memory = not isinstance(output, (str, os.PathLike))
+        in_memory = in_memory or render_format == 'pdf'
 
-        Returns:
-            smiles_list (List): List of SMILES strings from the metadata of the PDF
+        tmp = None if in_memory else self._create_temp_directory()
 
+        self.doc.filename = output
 
-        """
+        if grid:
+            # A grid image never spans more than the rows fitting on one page
+            rows_per_page = int((self.doc.height - 0.75 * inch - 0.3 * inch) // self.cell_width)
+            tables = self._stream_grids(self._record_smiles(smiles, stats), labels, tmp, include_failed_smiles,
+                                        workers, render_format, cache, min(chunk_size, rows_per_page * self.columns),
+                                        self.columns, timeout, renderer, coordinates, scaffold, stats=stats)
+        else:
+            tables = self._stream_tables(self._record_smiles(smiles, stats), labels, tmp, include_failed_smiles,
+                                         workers, render_format, cache, chunk_size, deduplicate, timeout, renderer,
+                                         coordinates, scaffold, stats=stats)
 
-        smiles_list = self.document.info[0]['smiles_list']
+        try:
+            # Build the PDF using Reportlab, the tables are pulled from the stream as the pages fill up and
+            # the SMILES metadata is written with the info dictionary when the canvas is saved
+            with stats.stage('layout'):
+                self.doc.build(
+                    _StreamingStory(self.story, tables),
+                    canvasmaker=partial(_MolPDFCanvas, smiles_list=self.smiles, smiles_pages=self.smiles_pages,
+                                        smiles_index=smiles_index, stats=stats)
+                )
 
-        return smiles_list
+        finally:
+            tables.close()
+            if tmp is not None:
+                self._destroy_temp_directory(tmp)
 
-class MolPDF(object):
+        stats.pages = self.doc.page
+        if isinstance(output, str):
+            stats.bytes_written = os.path.getsize(output)
 
-    __version__ = '0.1.0'
+        if callback is not None:
+            callback(stats)
+
+        return stats
 
-    def __init__ (self, name = 'molecules.pdf'):
+    def generate_bytes(self, smiles, labels=[], **options):
 
         """
 
+        Generate the report in memory, the molecules are rendered in memory too unless in_memory=False is passed.
+
         Arguments:
-            name_of_file (String): name of the pdf file that they want to produce
+            smiles (Iterable): List or generator of smiles you would like to pass in
+            labels (Iterable): List or generator of labels
+            options: keyword arguments of generate, the stats are handed to the callback
 
+        Returns:
+            pdf (Bytes): the PDF document
 
         """
 
-        if not isinstance(name, str):
-            print ('Please provide a list of smiles into MolPDF')
-            raise TypeError
+        buffer = BytesIO()
+        self.generate(smiles, labels, output=buffer, **options)
 
-        self.name = name
-        self.doc = self._intialize_doc_template()
-        self.story = []
-        self.temp_dir_name = ''
-        self.smiles = []
-        self.styles = self._set_reportlab_styles()
-        self.table_style_with_background, self.table_style_without_background = self._set_table_styles()
-        self.frame = self._create_frame()
-        self.canvas = canvas.Canvas(self.name)
-        self.page_template = self._create_page_template()
-        self.doc.addPageTemplates([self.page_template])
+        return buffer.getvalue()
 
-    def _intialize_doc_template(self):
+    def update(self, smiles, labels=[], callback=None, **options):
 
         """
 
+        Bring an existing document up to date with the molecules of the library without rebuilding it. Its SMILES
+        metadata is compared with the new SMILES, only the appended molecules or the pages holding changed ones
+        are rendered, and the new pages and SMILES metadata are written into an incremental update section
+        at the end of the file, the original bytes are never rewritten.
+
+        Pages can only be matched to molecules in documents generated with smiles_index, the others are rebuilt
+        with generate unless molecules were only appended, as are documents that do not exist yet.
+
         Arguments:
-            self (MolPDF Class Object): Instance of the MolPDF class
+            smiles (Iterable): SMILES of the whole library in order
+            labels (Iterable): labels of the whole library
+            callback (Callable): called with the MolPDFStats of the update
+            options: keyword arguments of generate used to render the molecules, the ones the document was
+                     generated with. The SMILES metadata keeps the form the document was generated with.
 
-        Return:
-            doc (ReportLab BaseDocTemplate Object): The initialized doc template from reportlab
+        Returns:
+            stats (MolPDFStats Object): timings and counters of the molecules rendered by the update
 
         """
 
-        # Initiate the template with the base rather than simple to install the header/footer
-        doc = BaseDocTemplate(self.name, rightMargin=.1 * inch, leftMargin=.1 * inch,
-                              topMargin=0.1 * inch, bottomMargin=1.5 * inch)
+        smiles, labels = list(smiles), list(labels)
 
-        return doc
+        if not isinstance(self.name, str) or not os.path.exists(self.name):
+            return self.generate(smiles, labels, callback=callback, **options)
 
-    def _set_reportlab_styles(self):
+        stats = MolPDFStats()
 
-        """
-        Set the base stylings of the reportlab
-        ​
-        Returns:
-            styles (Object): styles object with predefined styles to be used in the report. (Makes it easier a long the way).
-        ​
-        """
+        with stats.stage('parse'):
+            with MolPDFParser(self.name) as parser:
+                existing = parser.extract_smiles()
 
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='Center', alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='Right', alignment=TA_RIGHT))
-        styles.add(ParagraphStyle(name='Left', alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='Line_Data', alignment=TA_LEFT, fontSize=8, leading=7))
-        styles.add(ParagraphStyle(name='Line_Data_Small', alignment=TA_LEFT, fontSize=7, leading=8))
-        styles.add(ParagraphStyle(name='Line_Label_Large', alignment=TA_CENTER, fontSize=12, leading=12))
-        styles.add(ParagraphStyle(name='Line_Data_Largest', alignment=TA_LEFT, fontSize=14, leading=15))
-        styles.add(ParagraphStyle(name='Line_Label', font='Helvetica-Bold', fontSize=7, leading=6, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='Line_Label_Spacing', font='Helvetica-Bold', fontSize=7, leading=10, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='Line_Label_Center', font='Roboto', fontSize=5, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='Line_Label_Center_Big', font='Helvetica-Bold', fontSize=9, alignment=TA_CENTER))
+        self.smiles = smiles
+        self.smiles_pages = []
+        self.errors = []
 
-        return styles
+        with open(self.name, 'r+b') as f:
 
-    def _set_table_styles(self):
+            try:
+                reader = _PDFObjectReader(f)
+                info = reader.resolve(reader.trailer['Info'])
+                pages_reference = reader.resolve(reader.trailer['Root'])['Pages']
+                pages = reader.resolve(pages_reference)
+                kids = reader.resolve(pages['Kids'])
+
+                # Pages are swapped in the flat page tree written by reportlab
+                if any(reader.resolve(kid).get('Type') != 'Page' for kid in kids):
+                    raise _FastPathError('nested page tree')
+
+                page_starts = None
+                if info.get('smiles_stream') is not None:
+                    stream, _ = reader.read_object(info['smiles_stream'])
+                    page_starts = list(reader.resolve(stream['Pages']))
+                    page_starts += [len(existing)] * (len(kids) - len(page_starts))
+
+                segments = self._update_segments(existing, smiles, page_starts, len(kids))
+            except (_FastPathError, ValueError, KeyError, IndexError):
+                segments = None
+
+            if segments == []:
+                stats.pages = len(kids)
+            elif segments is not None:
+                self._write_update(f, reader, info, pages_reference, pages, kids, page_starts, segments, labels,
+                                   options, stats)
+
+        if segments is None:
+            return self.generate(smiles, labels, callback=callback, **options)
+
+        if callback is not None:
+            callback(stats)
+
+        return stats
+
+    def _update_segments(self, existing, smiles, page_starts, page_count):
 
         """
 
-        Return default table styles that we can use downstream for reports, will have to append as needed.
-        ​
+        Match the pages of the document to the changes of the library.
+
         Returns:
-            table_style_with_background (Object): Table style with the background of light grey
-            table_style_without_background (Object): Table style with the background as white.
+            segments (List): (first page, end page, start, stop) of every run of pages replaced by the molecules
+                             smiles[start:stop], None when the document has to be rebuilt
+
         """
 
-        table_style_with_background = TableStyle([
-            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.lightblue),
-            ('BOX', (0, 0), (-1, -1), 0.25, colors.lightblue),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN',(0,0),(-1,-1),'CENTER'),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightsalmon),
-        ])
+        common = 0
+        for common, (before, after) in enumerate(zip(existing, smiles)):
+            if before != after:
+                break
+        else:
+            common = min(len(existing), len(smiles))
 
-        table_style_without_background =TableStyle([
-            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.lightblue),
-            ('BOX', (0, 0), (-1, -1), 0.25, colors.lightblue),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN',(0,0),(-1,-1),'CENTER'),
-        ])
+        # Appended molecules go on new pages after the last one
+        if common == len(existing):
+            if len(smiles) == len(existing):
+                return []
+            return [(page_count, page_count, len(existing), len(smiles))]
 
-        return table_style_with_background, table_style_without_background
+        if page_starts is None:
+            return None
 
-    def _create_frame(self):
+        bounds = page_starts + [len(existing)]
+
+        # Inserted or removed molecules shift every molecule after them, the pages from the first change are redrawn
+        if len(smiles) != len(existing):
+            page = max(bisect_right(page_starts, common) - 1, 0)
+            return [(page, page_count, bounds[page], len(smiles))]
+
+        segments = []
+        for page in range(page_count):
+            start, stop = bounds[page], bounds[page + 1]
+            if existing[start:stop] == smiles[start:stop]:
+                continue
+            if segments and segments[-1][1] == page:
+                segments[-1] = (segments[-1][0], page + 1, segments[-1][2], stop)
+            else:
+                segments.append((page, page + 1, start, stop))
+
+        return segments
+
+    def _write_update(self, f, reader, info, pages_reference, pages, kids, page_starts, segments, labels, options,
+                      stats):
 
         """
 
-        Create the Frame for each page
+        Render the molecules of every segment into pages of their own and append them to the document along with
+        the page tree and the SMILES metadata.
 
-        Returns:
-             frame (ReportLab Frame Object): Frame of the page to prepare the canvas
         """
 
-        frame = Frame(self.doc.leftMargin, self.doc.bottomMargin, self.doc.width, self.doc.height-0.75*inch,
-                      id='footer-frame')
+        options = dict(options)
+        options.pop('smiles_index', None)
 
-        return frame
+        update = _PDFIncrementalUpdate(reader)
+        document_options = dict(columns=self.columns, cell_width=self.cell_width, image_size=self.image_size,
+                                show_smiles=self.show_smiles)
 
-    def _create_page_template(self):
+        new_kids = []
+        position = 0
 
-        """
+        for first_page, end_page, start, stop in segments + [(len(kids), len(kids), 0, 0)]:
 
-        Return:
-            page_template (ReportLab PageTemplate Object): Set the page template
+            new_kids.extend(kids[position:first_page])
+            if page_starts is not None:
+                self.smiles_pages.extend(page_starts[position:first_page])
+            position = end_page
 
+            if stop <= start:
+                continue
 
-        """
+            # The story of the document goes back on top of a redrawn first page
+            segment = MolPDF(name=BytesIO(), **document_options)
+            segment.story = list(self.story) if first_page == 0 else []
 
-        page_template = PageTemplate(id='footer-frame', frames=self.frame, onPage=partial(self._footer, styles = self.styles))
+            segment_stats = segment.generate(self.smiles[start:stop], labels[start:stop], **options)
+            stats.add(segment_stats)
 
-        return page_template
+            self.errors.extend(error._replace(index=error.index + start) for error in segment.errors)
+            smiles_pages = segment.smiles_pages + [stop - start] * (segment_stats.pages - len(segment.smiles_pages))
+            self.smiles_pages.extend(start + index for index in smiles_pages)
 
-    def add_spacer(self):
+            with stats.stage('write'):
+                source = _PDFObjectReader(segment.name)
+                segment_pages = source.resolve(source.trailer['Root'])['Pages']
+                copied = {segment_pages.objid: pages_reference}
+                for kid in source.resolve(source.resolve(segment_pages)['Kids']):
+                    new_kids.append(update.copy(source, kid, copied))
 
-        """
+        with stats.stage('metadata'):
+            update.add(dict(pages, Kids=new_kids, Count=len(new_kids)), objid=pages_reference.objid)
 
-        Add a spacer between objects. Appends to the story
+            info = {key: value for key, value in info.items() if key not in ('smiles_list', 'smiles_stream')}
+            if page_starts is not None:
+                content, offsets = _compress_smiles_blocks(self.smiles)
+                info['smiles_stream'] = update.add({
+                    'Type': 'MolPDFSmiles',
+                    'Count': len(self.smiles),
+                    'BlockSize': _smiles_block_size,
+                    'Offsets': offsets,
+                    'Pages': self.smiles_pages,
+                }, stream=content)
+            else:
+                info['smiles_list'] = [smiles.encode('utf-8') for smiles in self.smiles]
 
-        """
+            trailer = {'Root': reader.trailer['Root'], 'Info': update.add(info)}
+            if 'ID' in reader.trailer:
+                trailer['ID'] = reader.trailer['ID']
 
-        self.story.append(Spacer(0.1 * inch, .3 * inch))
+        with stats.stage('write'):
+            stats.bytes_written = update.write(f, **trailer)
+
+        stats.pages = len(new_kids)
+
+    def _generate_shards(self, smiles, labels, output, shard_size, shard_workers, merge, options, stats):
 
-    def _header(self, canvas, doc, styles):
         """
-        Draws the header on a canvas.
+
+        Build the shards of a sharded report in a process pool, write their manifest and optionally merge them.
 
         Arguments:
-            canvas (Canvas Object): Canvas to draw the header on
-            doc (ReportLab Object): Report lab document stemming from the BaseDocTemplate
+            output (String): path of the report, the shards and the manifest are named after it
+            options (Dict): keyword arguments of generate handed to every shard
 
         """
-        # Save the previous state
-        canvas.saveState()
 
-        header_text = ''
+        if not isinstance(output, str):
+            print ('Please provide a file name into MolPDF to generate shards')
+            raise ValueError
 
-        header_text = Paragraph("<b></b> <br />" + header_text, styles["Right"])
+        if not isinstance(shard_size, int) or shard_size < 1:
+            print ('Please provide a positive shard size into MolPDF')
+            raise ValueError
 
-        # Wrap the content in
-        width, height = header_text.wrap(doc.width, doc.topMargin)
-        draw_from = doc.height + doc.topMargin + height
+        if not isinstance(shard_workers, int) or shard_workers < 1:
+            print ('Please provide a positive number of shard workers into MolPDF')
+            raise ValueError
 
-        header_text.drawOn(canvas, doc.leftMargin, draw_from)
-        canvas.setLineWidth(0.9)
-        canvas.setStrokeColor(colors.teal)
-        canvas.line(3,draw_from-3,600,draw_from-3)
+        base, extension = os.path.splitext(output)
+        document_options = dict(columns=self.columns, cell_width=self.cell_width, image_size=self.image_size,
+                                show_smiles=self.show_smiles)
 
-        # Restore the canvas state
-        canvas.restoreState()
+        smiles, labels = iter(smiles), iter(labels)
+        cache = options['cache']
+        shards = []
+        paths = []
 
-    def _footer(self, canvas, doc, styles):
+        with ProcessPoolExecutor(max_workers=shard_workers) as executor:
 
-        """
+            # Keep a bounded number of shards in flight so the molecules of a huge library are not all queued
+            pending = deque()
 
-        Draw the footer
-        ​
-        Arguments:
-            canvas (Canvas Object): Canvas to draw the footer on
-            doc (ReportLab Object): Report lab document stemming from the BaseDocTemplate
-            styles (Reportlab Styles Object): sample sheet styling object coming from Reportlab
-        ​
-        """
-        #
-        # Save the previous state
-        canvas.saveState()
+            while True:
 
-        footer_text = ''
+                while len(pending) < shard_workers * 2:
 
-        footer_text = Paragraph(footer_text, self.styles["Center"])
+                    with stats.stage('parse'):
+                        chunk = list(islice(smiles, shard_size))
 
-        # Wrap the content in
-        footer_text.wrap(self.doc.width, self.doc.topMargin)
-        draw_from = self.doc.topMargin
-        footer_text.drawOn(canvas, self.doc.leftMargin, draw_from)
+                    # An empty library still gets a single empty shard
+                    number = len(shards) + len(pending)
+                    if not chunk and number:
+                        break
 
-        # Restore the canvas state
-        canvas.restoreState()
+                    path = '%s-%05d%s' % (base, number, extension)
+                    future = executor.submit(_generate_shard, path, document_options, self.story, chunk,
+                                             list(islice(labels, len(chunk))), options)
+                    pending.append((path, len(self.smiles), len(chunk), future))
+                    self.smiles.extend(chunk)
 
-    def add_title(self, title):
+                    if not chunk:
+                        break
 
-        """
+                if not pending:
+                    break
 
-        Add a big title to the center of the page
+                path, start, count, future = pending.popleft()
+                shard_stats, errors, smiles_pages = future.result()
 
-        Arguments:
-            title (String): title they would like on the page
+                stats.add(shard_stats)
+                if cache is not None:
+                    cache.hits += shard_stats.cache_hits
+                    cache.misses += shard_stats.cache_misses
 
+                # Positions of the shard are shifted to the whole report, pages without molecules point past it
+                self.errors.extend(error._replace(index=error.index + start) for error in errors)
+                smiles_pages = smiles_pages + [count] * (shard_stats.pages - len(smiles_pages))
+                self.smiles_pages.extend(start + index for index in smiles_pages)
 
-        """
+                paths.append(path)
+                shards.append({
+                    'file': os.path.basename(path),
+                    'start': start,
+                    'count': count,
+                    'pages': shard_stats.pages,
+                    'bytes': shard_stats.bytes_written,
+                })
 
-        title = Paragraph(title, self.styles['Line_Label_Center_Big'])
-        self.story.append(title)
+        with open(base + _manifest_suffix, 'w') as f:
+            json.dump({'count': len(self.smiles), 'shard_size': shard_size, 'shards': shards}, f, indent=2)
+
+        if merge:
+            with stats.stage('merge'):
+                self._merge_shards(output, paths, options['smiles_index'])
+            stats.bytes_written += os.path.getsize(output)
 
-    def add_image(self, temporary_directory, include_failed_smiles=False):
+    def _merge_shards(self, output, paths, smiles_index=False):
 
         """
 
+        Join the pages of the shards into a single document carrying the SMILES metadata of the whole report,
+        the pages are copied as they are.
+
         Arguments:
-            temporary_directory (tempfile object): Temporary directory of the module
-            include_failed_smiles (Bool): whether the user would like to include failed smiles.
+            output (String): path of the merged document
+            paths (List): paths of the shards in order
+            smiles_index (Bool): store the SMILES as an indexed stream rather than a list
 
         """
 
-        indigo = Indigo()
-        renderer = IndigoRenderer(indigo)
+        writer = PdfWriter(output)
+        info = IndirectPdfDict()
+
+        for number, path in enumerate(paths):
+            shard = PdfReader(path)
+            writer.addpages(shard.pages)
+
+            # The creator and dates of the first shard stand for the merged document
+            if number == 0 and shard.Info is not None:
+                for key, value in shard.Info.items():
+                    if key not in ('/smiles_list', '/smiles_stream'):
+                        info[key] = value
+
+        if smiles_index:
+            content, offsets = _compress_smiles_blocks(self.smiles)
+            stream = IndirectPdfDict(
+                Type=PdfName.MolPDFSmiles,
+                Count=len(self.smiles),
+                BlockSize=_smiles_block_size,
+                Offsets=PdfArray(offsets),
+                Pages=PdfArray(self.smiles_pages),
+            )
+            # pdfrw holds stream data as latin-1 text
+            stream.stream = content.decode('latin-1')
+            info.smiles_stream = stream
+        else:
+            info.smiles_list = PdfArray([PdfString.from_bytes(smiles.encode('utf-8')) for smiles in self.smiles])
 
-        chemical_data = []
+        writer.trailer.Info = info
+        writer.write()
 
-        for smiles in self.smiles:
+    def _after_flowable(self, flowable):
 
-            try:
-                molecule = indigo.loadMolecule(smiles)
-            except IndigoException as e:
-                if include_failed_smiles:
-                    self.add_row("Failed Rendering", smiles)
-                return
+        """
 
-            molecule.layout() # if not called, will be done automatically by the renderer
-            indigo.setOption("render-output-format", "png")
-            indigo.setOption("render-image-size", 200, 200)
-            indigo.setOption("render-background-color", 1.0, 1.0, 1.0)
+        Reportlab hook called once a flowable is drawn, keeps the index of the first molecule of every page.
 
-            import uuid
+        """
 
-            path = os.path.join(temporary_directory,  str(uuid.uuid4()) + '.png')
+        index = getattr(flowable, '_molpdf_index', None)
 
-            renderer.renderToFile(molecule, filename=path)
-            image = Image(path, 0.5 * inch, 0.5 * inch, hAlign='CENTER')
+        if index is not None:
+            while len(self.smiles_pages) < self.doc.page:
+                self.smiles_pages.append(index)
 
-            chemical_data.append([image, smiles])
+    def _record_error(self, index, smiles, label, error, stats):
 
-        self.add_table(chemical_data)
+        """
 
+        Keep the failure of a molecule in the error report of the document.
 
-    def _create_temp_directory(self):
+        Arguments:
+            index (Int): position of the SMILES in the input
+            error (Tuple): (stage, message) of the failure
 
         """
 
-        Prepare a temporary directory to render the molecule images.
+        stage, message = error
+        stats.failures += 1
+        self.errors.append(MolPDFError(index, smiles, label, stage, message))
 
-        Creates:
-            tmp (directory): create a directory in the cwd.
+    def _record_smiles(self, smiles, stats):
 
         """
 
-        from tempfile import gettempdir
-        tmp = os.path.join(gettempdir(), '.{}'.format(hash(os.times())))
-        os.makedirs(tmp)
+        Pass the SMILES through while keeping every consumed SMILES for the metadata.
+
+        """
 
-        return tmp
+        smiles = iter(smiles)
+        end = object()
 
+        while True:
 
-    def _destroy_temp_directory(self, tmp):
+            with stats.stage('parse'):
+                smiles_string = next(smiles, end)
+
+            if smiles_string is end:
+                return
+
+            # The metadata keeps the SMILES alone, packed into the SMILES store without the molfile of a MolRecord
+            stats.molecules += 1
+            self.smiles.append(smiles_string)
+            yield smiles_string
+
+    def _stream_tables(self, smiles, labels, *args, stats):
 
         """
 
-        Destroys the temporary directory as a part of cleanup
+        Generator of the table flowables for each rendered chunk.
 
         """
 
-        shutil.rmtree(tmp, ignore_errors=True)
+        for chemical_data in self._render_chunks(smiles, labels, *args, stats=stats):
+            with stats.stage('table'):
+                tables = self._build_tables(chemical_data)
+            yield tables
 
-    def _add_table_label(self, smiles):
+    def _stream_grids(self, smiles, labels, temporary_directory, include_failed_smiles=False, workers=1,
+                      render_format='png', cache=None, chunk_size=64, columns=8, timeout=None, renderer=None,
+                      coordinates=None, scaffold=None, stats=None):
 
         """
 
-        Generate the table header - pretty simple for now and keeping with molecule 2D images and the SMILES.
-
+        Generator of the grid image flowables, every chunk of molecules is rendered by a single grid render call
+        and placed as one image. Up to one chunk per worker is rendered ahead of the layout.
 
         """
 
-        overview_information = [[
-            Paragraph('%s' % smiles, self.styles["Line_Label_Center"]),
-        ]]
+        smiles = enumerate(smiles)
+        labels = iter(labels)
+        stats = stats or MolPDFStats()
 
-        overview_table = Table(overview_information, colWidths=(1.5 * inch))
-        overview_table.setStyle(self.table_style_with_background)
-        self.story.append(overview_table)
+        executor = None
 
-    def add_table(self, chemical_data):
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_initialize_render_worker,
+                                           initargs=(timeout, cache, coordinates))
+            render = partial(_render_grid_worker, columns=columns, temporary_directory=temporary_directory,
+                             render_format=render_format, include_failed_smiles=include_failed_smiles,
+                             scaffold=scaffold)
+        else:
+            session = renderer or MolRenderer()
+            session.set_options(_timeout_option(timeout))
+            render = partial(_render_grid, session, columns=columns,
+                             temporary_directory=temporary_directory, render_format=render_format, cache=cache,
+                             include_failed_smiles=include_failed_smiles, coordinates=coordinates,
+                             scaffold=scaffold)
+
+        def submit():
+            chunk = list(islice(smiles, chunk_size))
+            if not chunk:
+                return None
+            molecules = [(smiles_string, next(labels, None)) for _, smiles_string in chunk]
+            if executor is None:
+                return chunk, molecules, partial(render, molecules)
+            return chunk, molecules, executor.submit(render, molecules).result
 
-        """
+        try:
+            pending = deque()
 
-        Adds a row of the 2D image of a molecule and then the SMILES as one row.
+            while True:
 
-        Arguments
-            chemical_data (List): List of objects for the image and smiles [[image1, smiles1], [image2, smiles2]]
+                with stats.stage('render'):
+                    while len(pending) < workers:
+                        task = submit()
+                        if task is None:
+                            break
+                        pending.append(task)
 
-        """
+                    if not pending:
+                        break
 
-        max_cols = 8
-        col_widths = [
-                0.85 * inch,
-                0.85 * inch,
-                0.85 * inch,
-                0.85 * inch,
-                0.85 * inch,
-                0.85 * inch,
-                0.85 * inch,
-                0.85 * inch
-        ]
+                    chunk, molecules, result = pending.popleft()
+                    image, cached, rows, failures = result()
 
-        if len(chemical_data) < max_cols:
+                for position, stage, message in failures:
+                    smiles_string, label = molecules[position]
+                    self._record_error(chunk[position][0], smiles_string, label, (stage, message), stats)
 
+                if image is None:
+                    continue
 
-            row = [[]]
+                if cache is not None:
+                    if cached:
+                        cache.hits += 1
+                        stats.cache_hits += 1
+                    else:
+                        cache.misses += 1
+                        stats.cache_misses += 1
 
-            # Images
+                width, height = columns * self.cell_width, rows * self.cell_width
 
-            for i in range(0, len(chemical_data)):
-                row[0].append(chemical_data[i][0])
+                with stats.stage('table'):
+                    if render_format == 'pdf':
+                        grid = flowable_vector(image, width, height)
+                    else:
+                        if isinstance(image, bytes):
+                            image = BytesIO(image)
+                        grid = Image(image, width, height, hAlign='CENTER')
 
-            table = Table(row, colWidths=col_widths)
-            table.setStyle(self.table_style_without_background)
+                grid._molpdf_index = chunk[0][0]
 
-            self.story.append(table)
+                yield [grid, Spacer(0.1 * inch, .3 * inch)]
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
-            row = [[]]
+# Render session of every AsyncMolPDF and shard worker, kept from one report to the next
+# --------------------------------------------------------------------------------------
+_document_sessions = threading.local()
 
-            # SMILES
+def _generate_document(name, document_options, title, smiles, labels, options):
 
-            for i in range(0, len(chemical_data)):
-                row[0].append(Paragraph(chemical_data[i][1], self.styles["Line_Label_Center"]),)
+    """
 
-            table = Table(row, colWidths=col_widths)
-            table.setStyle(self.table_style_without_background)
+    Build a whole MolPDF document, run by AsyncMolPDF off the event loop.
 
-            self.story.append(table)
+    Arguments:
+        name (String): path of the PDF, None returns the PDF as bytes
+        document_options (Dict): keyword arguments of MolPDF
+        title (String): optional title of the document
+        options (Dict): keyword arguments of MolPDF.generate
 
-            # Labels
+    Returns:
+        result (Tuple): the bytes of the PDF (None when written to name) and the MolPDFStats of the report
 
-            if self.labels:
+    """
 
-                row = [[]]
+    output = BytesIO() if name is None else name
 
-                for i in range(0, len(chemical_data)):
-                    row[0].append(Paragraph(self.labels[i], self.styles["Line_Label_Center"]),)
+    options = dict(options, renderer=_document_renderer())
 
-                table = Table(row, colWidths=col_widths)
-                table.setStyle(self.table_style_without_background)
-                self.story.append(table)
+    # Concurrent reports render in memory rather than each going through a temporary directory
+    if options.get('in_memory') is None:
+        options['in_memory'] = True
 
-        else:
+    document = MolPDF(name=output, **document_options)
 
-            for i in range(0, len(chemical_data), max_cols):
+    if title:
+        document.add_title(title)
+        document.add_spacer()
 
-                data_left = len(chemical_data) - i
+    stats = document.generate(smiles=smiles, labels=labels, **options)
 
-                if data_left < max_cols:
+    return (output.getvalue() if name is None else None), stats
 
-                    for i in range(0, data_left):
+def _generate_shard(name, document_options, story, smiles, labels, options):
 
-                        # Images
+    """
 
-                        row = [[]]
+    Build one shard of a sharded report, run in the process pool of MolPDF.generate.
 
-                        row[0].append(chemical_data[data_left + i][0])
+    Arguments:
+        story (List): flowables of the report placed ahead of the molecules of every shard
 
-                        table = Table(row, colWidths=col_widths)
-                        table.setStyle(self.table_style_without_background)
+    Returns:
+        result (Tuple): the MolPDFStats of the shard, its errors and the index of the first molecule of every page
 
-                        self.story.append(table)
+    """
 
-                        # SMILES
+    # The images of a shard are only needed until its pages are written
+    if options.get('in_memory') is None:
+        options = dict(options, in_memory=True)
 
-                        row = [[]]
+    document = MolPDF(name=name, **document_options)
+    document.story = list(story)
 
-                        row[0].append(
-                            Paragraph(
-                                chemical_data[data_left + i][1],
-                                self.styles["Line_Label_Center"]),
-                        )
+    stats = document.generate(smiles=smiles, labels=labels, renderer=_document_renderer(), **options)
 
-                        table = Table(row, colWidths=col_widths)
-                        table.setStyle(self.table_style_without_background)
+    return stats, document.errors, document.smiles_pages
 
-                        self.story.append(table)
+def _document_renderer():
 
-                        # Labels
+    # The render session of the worker is set up on its first report
+    if getattr(_document_sessions, 'renderer', None) is None:
+        _document_sessions.renderer = MolRenderer()
 
-                        if self.labels:
+    return _document_sessions.renderer
 
-                            row = [[]]
+class AsyncMolPDF(object):
 
-                            row[0].append(
-                                Paragraph(
-                                    chemical_data[data_left + i][1],
-                                    self.styles["Line_Label_Center"]),
-                            )
+    """
 
-                            table = Table(row, colWidths=col_widths)
-                            table.setStyle(self.table_style_without_background)
+    Generate MolPDF documents from asyncio code, every report is rendered and built in a worker so the event
+    loop is never blocked, and at most max_concurrency reports run at once, the others wait their turn.
 
-                            self.story.append(table)
+    """
 
-                else:
+    __version__ = '0.1.0'
 
-                    row = [[
-                        chemical_data[i][0],
-                        chemical_data[i + 1][0],
-                        chemical_data[i + 2][0],
-                        chemical_data[i + 3][0],
-                        chemical_data[i + 4][0],
-                        chemical_data[i + 5][0],
-                        chemical_data[i + 6][0],
-                        chemical_data[i + 7][0],
+    def __init__ (self, max_concurrency=4, processes=True):
 
-                    ]]
+        """
 
-                    table = Table(row, colWidths=col_widths)
-                    table.setStyle(self.table_style_without_background)
-                    self.story.append(table)
+        Arguments:
+            max_concurrency (Int): number of reports generated at the same time
+            processes (Bool): build the reports in a process pool, threads share the interpreter with the loop
 
-                    row = [[
-                        Paragraph(chemical_data[i][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 1][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 2][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 3][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 4][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 5][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 6][1], self.styles["Line_Label_Center"]),
-                        Paragraph(chemical_data[i + 7][1], self.styles["Line_Label_Center"]),
+        """
 
-                    ]]
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            print ('Please provide a positive max_concurrency into AsyncMolPDF')
+            raise ValueError
 
-                    table = Table(row, colWidths=col_widths)
-                    table.setStyle(self.table_style_without_background)
-                    self.story.append(table)
+        self.max_concurrency = max_concurrency
+        self.processes = processes
+        self._executor = None
+        self._semaphore = None
 
-                    if self.labels:
+    async def generate(self, smiles, labels=[], name=None, title=None, document_options=None, callback=None,
+                       **options):
 
-                        row = [[
-                            Paragraph(self.labels[i], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 1], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 2], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 3], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 4], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 5], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 6], self.styles["Line_Label_Center"]),
-                            Paragraph(self.labels[i + 7], self.styles["Line_Label_Center"]),
+        """
 
-                        ]]
+        Arguments:
+            smiles (Iterable): SMILES of the report, consumed before the report is queued
+            labels (Iterable): labels of the molecules
+            name (String): path the PDF is written to, None returns it as bytes
+            title (String): optional title of the document
+            document_options (Dict): keyword arguments of MolPDF such as columns or show_smiles
+            callback (Callable): called with the MolPDFStats of the report in the event loop
+            options: keyword arguments of MolPDF.generate such as workers, render_format or grid
 
-                        table = Table(row, colWidths=col_widths)
-                        table.setStyle(self.table_style_without_background)
-                        self.story.append(table)
+        Returns:
+            pdf (Bytes or String): the PDF as bytes when no name is given, else the name it was written to
 
+        """
 
-            self.add_spacer()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            executor_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.max_concurrency)
 
-    @timeit
-    def generate(self, smiles, labels=[], include_failed_smiles=False):
+        # Generators can not be sent to a process, the molecules of a report are held for its duration anyway
+        if self.processes:
+            smiles, labels = list(smiles), list(labels)
 
+        async with self._semaphore:
+            data, stats = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                partial(_generate_document, name, document_options or {}, title, smiles, labels, options)
+            )
 
-        """
+        if callback is not None:
+            callback(stats)
 
-        Build the story and generate the final pdf
+        return name if data is None else data
 
-        Arguments:
-            smiles (List): List of smiles you would like to pass in
-            labels (List): List of labels that might need to be added based on the user.
-            include_failed_smiles (Bool): Whether the user wants to include failed smiles.
+    def close(self):
 
         """
 
-        tmp = self._create_temp_directory()
-
-        self.labels = labels
+        Shut the workers down once the running reports are done.
 
-        try:
-            self.smiles = smiles
+        """
 
-            self.add_image(tmp, include_failed_smiles)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._semaphore = None
 
-            # Build the initial PDF using Reportlab
-            self.doc.build(self.story)
+    async def __aenter__(self):
+        return self
 
-            # Read back in the PDF to add metadata using the PDF Writer
-            # Currently in reportlab there isn't a way to support adding info on the pdf
-            trailer = PdfReader(self.name)
-            trailer.Info.smiles_list = self.smiles
-            PdfWriter(self.name, trailer=trailer).write()
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
 
-        finally:
-            self._destroy_temp_directory(tmp)
+# Renderer libraries already loaded, keyed by path
+_renderer_libraries = {}
 
 class IndigoRenderer(object):
     def __init__(self, indigo):
         self.indigo = indigo
 
         if os.name == 'posix' and not platform.mac_ver()[0]:
-            self._lib = CDLL(indigo.dllpath + "/libindigo-renderer.so")
+            path = indigo.dllpath + "/libindigo-renderer.so"
         elif os.name == 'nt':
-            self._lib = CDLL(indigo.dllpath + "\indigo-renderer.dll")
+            path = indigo.dllpath + "\indigo-renderer.dll"
         elif platform.mac_ver()[0]:
-            self._lib = CDLL(indigo.dllpath + "/libindigo-renderer.dylib")
+            path = indigo.dllpath + "/libindigo-renderer.dylib"
         else:
             raise IndigoException("unsupported OS: " + os.name)
 
+        if path in _renderer_libraries:
+            self._lib = _renderer_libraries[path]
+            return
+
+        self._lib = _renderer_libraries[path] = CDLL(path)
+
         self._lib.indigoRender.restype = c_int
         self._lib.indigoRender.argtypes = [c_int, c_int]
         self._lib.indigoRenderToFile.restype = c_int
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+#
+# MolPDF - Streaming readers of molecule files
+#
+# --------------------------------------------
+
+# imports
+# -------
+import csv
+import gzip
+import io
+import os
+import sys
+from itertools import tee
+
+from indigo import Indigo, IndigoException
+
+# Input formats guessed from the file extension, a .gz suffix is looked through
+# -----------------------------------------------------------------------------
+_extensions = {
+    '.smi': 'smi',
+    '.smiles': 'smi',
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.sdf': 'sdf',
+    '.sd': 'sdf',
+    '.mol': 'sdf',
+}
+
+_gzip_magic = b'\x1f\x8b'
+
+class MolRecord(str):
+
+    """
+
+    SMILES of a molecule read from a molfile, the molfile travels along so the molecule is drawn with the 2D
+    coordinates it came with instead of being laid out again. It is a plain SMILES string everywhere else.
+
+    """
+
+    __slots__ = ('molfile', )
+
+    def __new__(cls, smiles, molfile=None):
+
+        record = str.__new__(cls, smiles)
+        record.molfile = molfile
+
+        return record
+
+    def __reduce__(self):
+        return MolRecord, (str(self), self.molfile)
+
+class MolReader(object):
+
+    """
+
+    Streams the molecules of a .smi, csv/tsv or SDF file as (smiles, label) pairs, one record at a time so
+    MolPDF.generate starts rendering before the file is read through. Gzip compressed files are recognised by
+    their content.
+
+    """
+
+    __version__ = '0.1.0'
+
+    def __init__ (self, path, input_format=None, smiles_column='smiles', label_columns=(), delimiter=None):
+
+        """
+
+        Arguments:
+            path (String or File Object): path of the file, '-' for stdin, or a binary file object
+            input_format (String): 'smi', 'csv', 'tsv' or 'sdf', guessed from the extension of the path by default
+            smiles_column (String): SMILES column of csv/tsv files
+            label_columns (List): columns of csv/tsv files, field indices of .smi lines or properties of SDF
+                                  records joined into the label, by default the rest of a .smi line and the title
+                                  of an SDF record
+            delimiter (String): delimiter of csv files
+
+        """
+
+        if input_format is None:
+            input_format = 'smi'
+            if isinstance(path, str) and path != '-':
+                root, extension = os.path.splitext(path)
+                if extension.lower() == '.gz':
+                    extension = os.path.splitext(root)[1]
+                input_format = _extensions.get(extension.lower(), 'smi')
+
+        if input_format not in ('smi', 'csv', 'tsv', 'sdf'):
+            print ('Please provide an input format of smi, csv, tsv or sdf into MolReader')
+            raise ValueError
+
+        label_columns = list(label_columns)
+
+        # Fields of a .smi line are picked by their index, checked here rather than half way through the file
+        if input_format == 'smi':
+            try:
+                label_columns = [int(column) for column in label_columns]
+            except (TypeError, ValueError):
+                print ('Please provide field indices as the label columns of a .smi file into MolReader')
+                raise ValueError
+
+        self.path = path
+        self.input_format = input_format
+        self.smiles_column = smiles_column
+        self.label_columns = label_columns
+        self.delimiter = delimiter or ('\t' if input_format == 'tsv' else ',')
+
+    def __iter__(self):
+
+        """
+
+        Yields:
+            record (Tuple): (smiles, label) of every molecule, the SMILES of an SDF record is a MolRecord and the
+                            label None when the record has no label text
+
+        """
+
+        handle, opened = self._open()
+
+        try:
+            if self.input_format in ('csv', 'tsv'):
+                records = self._read_csv(handle)
+            elif self.input_format == 'sdf':
+                records = self._read_sdf(handle)
+            else:
+                records = self._read_smi(handle)
+
+            for record in records:
+                yield record
+        finally:
+            # stdin and the file objects of the caller are left open
+            handle.detach()
+            if opened is not None:
+                opened.close()
+
+    def split(self):
+
+        """
+
+        Returns:
+            smiles (Iterator): SMILES of the molecules, to be passed to MolPDF.generate
+            labels (Iterator): labels of the molecules, read along with the SMILES
+
+        """
+
+        smiles_records, label_records = tee(self)
+
+        return (smiles for smiles, _ in smiles_records), (label for _, label in label_records)
+
+    def _open(self):
+
+        """
+
+        Returns:
+            handle (TextIOWrapper): text of the file, decompressed when it starts with the gzip magic number
+            opened (File Object): the file opened by the reader, None for stdin and file objects
+
+        """
+
+        opened = None
+
+        if self.path == '-':
+            stream = sys.stdin.buffer
+        elif isinstance(self.path, str):
+            stream = opened = open(self.path, 'rb')
+        else:
+            stream = self.path
+
+        if hasattr(stream, 'peek'):
+            magic = stream.peek(2)[:2]
+        else:
+            magic = stream.read(2)
+            stream.seek(-len(magic), 1)
+
+        if magic == _gzip_magic:
+            stream = gzip.GzipFile(fileobj=stream)
+
+        return io.TextIOWrapper(stream, encoding='utf-8', newline=''), opened
+
+    def _read_smi(self, handle):
+
+        """
+
+        Yields (smiles, label) from a .smi file, the label being the rest of the line by default and None when
+        there is no text to label the molecule with.
+
+        """
+
+        for line in handle:
+            fields = line.split()
+            if not fields:
+                continue
+            if self.label_columns:
+                label = ' '.join(fields[column] for column in self.label_columns if column < len(fields))
+            else:
+                label = ' '.join(fields[1:])
+            # No label text leaves the label out, MolPDF then skips the row of labels
+            yield fields[0], label or None
+
+    def _read_csv(self, handle):
+
+        """
+
+        Yields (smiles, label) from a csv/tsv file with a header row, the label is None when its columns are empty.
+
+        """
+
+        for row in csv.DictReader(handle, delimiter=self.delimiter):
+            label = ' '.join(row.get(column) or '' for column in self.label_columns).strip()
+            yield row[self.smiles_column], label or None
+
+    def _read_sdf(self, handle):
+
+        """
+
+        Yields (smiles, label) from the records of an SDF file, the label being the record title by default.
+
+        """
+
+        indigo = Indigo()
+        lines = []
+
+        for line in handle:
+            if line.startswith('$$$$'):
+                if any(text.strip() for text in lines):
+                    yield self._sdf_record(indigo, lines)
+                lines = []
+            else:
+                lines.append(line.rstrip('\r\n'))
+
+        if any(text.strip() for text in lines):
+            yield self._sdf_record(indigo, lines)
+
+    def _sdf_record(self, indigo, lines):
+
+        """
+
+        Split an SDF record into its molfile and data items.
+
+        Returns:
+            record (Tuple): (smiles, label) of the record, the SMILES being a MolRecord carrying the molfile
+
+        """
+
+        end = next((number for number, line in enumerate(lines) if line.startswith('M  END')), len(lines) - 1)
+        molfile = '\n'.join(lines[:end + 1]) + '\n'
+
+        properties = {}
+        name = None
+
+        for line in lines[end + 1:]:
+            if line.startswith('>') and '<' in line:
+                name = line[line.index('<') + 1:line.rindex('>')]
+                properties[name] = []
+            elif name is not None and line.strip():
+                properties[name].append(line)
+            else:
+                name = None
+
+        if self.label_columns:
+            label = ' '.join('\n'.join(properties.get(column, [])) for column in self.label_columns).strip()
+        else:
+            label = lines[0].strip()
+
+        # A molfile Indigo can not read keeps an empty SMILES and fails when it is rendered
+        try:
+            smiles = indigo.loadMolecule(molfile).smiles()
+        except IndigoException:
+            smiles = ''
+
+        return MolRecord(smiles, molfile), label or None
@@ -37,6 +37,11 @@ setup(
     name="molpdf",
     version="1.0.1",
     packages=['molpdf'],
+    entry_points={
+        'console_scripts': [
+            'molpdf=molpdf.cli:main',
+        ],
+    },
     license='GPL',
     author="Suliman Sharif",
     author_email="sharifsuliman1@gmail.com",
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#
+# MolPDF - Tests of the trailer reader of MolPDFParser
+#
+# ----------------------------------------------------
+
+# imports
+# -------
+import glob
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from io import BytesIO
+
+from molpdf import MolPDF, MolPDFParser
+from molpdf.molpdf import _PDFLexer, _PDFObjectReader, _PDFReference, _FastPathError
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+def build_pdf(sections):
+
+    """
+
+    Write a small PDF with classic cross reference tables, every section after the first is appended as an
+    incremental update pointing back to the previous one with /Prev.
+
+    Arguments:
+        sections (List): (objects, trailer) of every section, objects mapping an object number to its body
+
+    Returns:
+        data (Bytes): the PDF file
+
+    """
+
+    data = b'%PDF-1.4\n'
+    prev = None
+
+    for objects, trailer in sections:
+        offsets = {}
+        for objid in sorted(objects):
+            offsets[objid] = len(data)
+            data += b'%d 0 obj\n' % objid + objects[objid] + b'\nendobj\n'
+
+        xref = len(data)
+        data += b'xref\n0 1\n0000000000 65535 f \n'
+        for objid in sorted(offsets):
+            data += b'%d 1\n%010d 00000 n \n' % (objid, offsets[objid])
+
+        if prev is not None:
+            trailer += b' /Prev %d' % prev
+        data += b'trailer\n<< ' + trailer + b' >>\nstartxref\n%d\n%%%%EOF\n' % xref
+        prev = xref
+
+    return data
+
+def build_xref_stream_pdf(objects, trailer):
+
+    """
+
+    Write a small PDF indexed by a cross reference stream instead of a table.
+
+    """
+
+    data = b'%PDF-1.5\n'
+    offsets = {}
+
+    for objid in sorted(objects):
+        offsets[objid] = len(data)
+        data += b'%d 0 obj\n' % objid + objects[objid] + b'\nendobj\n'
+
+    xref_id = max(objects) + 1
+    offsets[xref_id] = len(data)
+
+    entries = struct.pack('>BIH', 0, 0, 65535)
+    for objid in range(1, xref_id + 1):
+        entries += struct.pack('>BIH', 1, offsets[objid], 0)
+
+    data += (b'%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Length %d ' % (xref_id, xref_id + 1, len(entries))
+             + trailer + b' >>\nstream\n' + entries + b'\nendstream\nendobj\n')
+    data += b'startxref\n%d\n%%%%EOF\n' % offsets[xref_id]
+
+    return data
+
+CATALOG = {
+    1: b'<< /Type /Catalog /Pages 2 0 R >>',
+    2: b'<< /Type /Pages /Kids [] /Count 0 >>',
+}
+
+class ParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def extract(self, path):
+
+        """
+
+        Returns:
+            fast (List): SMILES read by following the trailer
+            fallback (List): SMILES read by pdfminer
+            used_fast_path (Bool): whether the trailer reader handled the file
+
+        """
+
+        with MolPDFParser(path) as parser:
+            fast = parser.extract_smiles()
+            used_fast_path = parser._reader is not None
+
+        with MolPDFParser(path) as parser:
+            # Parsing the whole document first sends the parser down the pdfminer path
+            parser.document
+            fallback = parser.extract_smiles()
+
+        return fast, fallback, used_fast_path
+
+class TestPDFLexer(ParserTestCase):
+
+    def tokens(self, data):
+        lexer = _PDFLexer(BytesIO(data + b' end'), 0)
+        tokens = []
+        while True:
+            token = lexer.next_token()
+            if token == ('keyword', b'end'):
+                return tokens
+            tokens.append(token)
+
+    def test_escaped_strings(self):
+
+        tokens = self.tokens(b'(F/C=C\\\\F) (CC\\(C\\)O) (CC(C)O) (a\\nb) (\\101\\60) (line\\\ncontinued)')
+
+        self.assertEqual(tokens, [
+            ('string', b'F/C=C\\F'),
+            ('string', b'CC(C)O'),
+            ('string', b'CC(C)O'),
+            ('string', b'a\nb'),
+            ('string', b'A0'),
+            ('string', b'linecontinued'),
+        ])
+
+    def test_hex_strings_names_and_numbers(self):
+
+        tokens = self.tokens(b'<4343 4f> <434> /smiles_list /a#20b 12 -3.5 R << >> [ ] % comment\n true')
+
+        self.assertEqual(tokens, [
+            ('string', b'CCO'),
+            ('string', b'C@'),
+            ('name', 'smiles_list'),
+            ('name', 'a b'),
+            ('number', 12),
+            ('number', -3.5),
+            ('keyword', b'R'),
+            ('delimiter', b'<<'),
+            ('delimiter', b'>>'),
+            ('delimiter', b'['),
+            ('delimiter', b']'),
+            ('keyword', b'true'),
+        ])
+
+    def test_unterminated_string(self):
+
+        lexer = _PDFLexer(BytesIO(b'(CCO'), 0)
+
+        with self.assertRaises(_FastPathError):
+            lexer.next_token()
+
+class TestPDFObjectReader(ParserTestCase):
+
+    def test_escaped_smiles_list(self):
+
+        smiles_list = ['F/C=C\\F', 'CC(C)(C)O', 'C(=O)(O)c1ccccc1', 'N[C@@H](C)C(=O)O']
+
+        objects = dict(CATALOG)
+        objects[3] = b'<< /Producer (MolPDF) /smiles_list [(F/C=C\\\\F) (CC\\(C\\)\\(C\\)O) (C(=O)(O)c1ccccc1) ' \
+                     b'(N[C@@H]\\(C\\)C\\(=O\\)O)] >>'
+        path = self.write('escaped.pdf', build_pdf([(objects, b'/Size 4 /Root 1 0 R /Info 3 0 R')]))
+
+        fast, fallback, used_fast_path = self.extract(path)
+
+        self.assertTrue(used_fast_path)
+        self.assertEqual(fast, smiles_list)
+        self.assertEqual(fallback, smiles_list)
+
+    def test_prev_chain(self):
+
+        first = dict(CATALOG)
+        first[3] = b'<< /smiles_list [(CCO) (CCN)] >>'
+        first[4] = b'(unused)'
+
+        # The update replaces the info dictionary, the older sections still hold the other objects
+        second = {3: b'<< /smiles_list [(CCO) (CCN) (CCC)] /Extra 4 0 R >>'}
+        third = {5: b'<< /smiles_list [(CCCl)] >>'}
+
+        path = self.write('updated.pdf', build_pdf([
+            (first, b'/Size 5 /Root 1 0 R /Info 3 0 R'),
+            (second, b'/Size 5 /Root 1 0 R /Info 3 0 R'),
+            (third, b'/Size 6 /Root 1 0 R /Info 5 0 R'),
+        ]))
+
+        with open(path, 'rb') as f:
+            reader = _PDFObjectReader(f)
+            self.assertEqual(len(reader.sections), 3)
+            self.assertEqual(reader.trailer['Info'], _PDFReference(5, 0))
+            self.assertEqual(reader.resolve(_PDFReference(3, 0))['Extra'], _PDFReference(4, 0))
+            self.assertEqual(reader.resolve(_PDFReference(4, 0)), b'unused')
+
+        fast, fallback, used_fast_path = self.extract(path)
+
+        self.assertTrue(used_fast_path)
+        self.assertEqual(fast, ['CCCl'])
+        self.assertEqual(fallback, ['CCCl'])
+
+    def test_xref_stream_falls_back_to_pdfminer(self):
+
+        objects = dict(CATALOG)
+        objects[3] = b'<< /smiles_list [(CCO) (c1ccccc1) (F/C=C\\\\F)] >>'
+        path = self.write('xref-stream.pdf', build_xref_stream_pdf(objects, b'/Root 1 0 R /Info 3 0 R'))
+
+        with open(path, 'rb') as f:
+            with self.assertRaises(_FastPathError):
+                _PDFObjectReader(f)
+
+        fast, fallback, used_fast_path = self.extract(path)
+
+        self.assertFalse(used_fast_path)
+        self.assertEqual(fast, ['CCO', 'c1ccccc1', 'F/C=C\\F'])
+        self.assertEqual(fallback, fast)
+
+    def test_legacy_examples(self):
+
+        paths = sorted(glob.glob(os.path.join(EXAMPLES, '**', '*.pdf'), recursive=True))
+        self.assertTrue(paths)
+
+        for path in paths:
+            fast, fallback, used_fast_path = self.extract(path)
+            self.assertTrue(used_fast_path, path)
+            self.assertTrue(fast, path)
+            self.assertEqual(fast, fallback, path)
+
+class TestMolPDFRoundTrip(ParserTestCase):
+
+    smiles_list = ['F/C=C\\F', 'CC(C)(C)O', 'OC(=O)c1ccccc1', 'C[C@H](N)C(=O)O', 'CCO']
+
+    def generate(self, **options):
+        path = os.path.join(self.directory, 'round-trip.pdf')
+        MolPDF(name=path).generate(smiles=self.smiles_list, in_memory=True, **options)
+        return path
+
+    def test_smiles_list(self):
+
+        fast, fallback, used_fast_path = self.extract(self.generate())
+
+        self.assertTrue(used_fast_path)
+        self.assertEqual(fast, self.smiles_list)
+        self.assertEqual(fallback, self.smiles_list)
+
+    def test_smiles_index(self):
+
+        path = self.generate(smiles_index=True)
+        fast, fallback, used_fast_path = self.extract(path)
+
+        self.assertTrue(used_fast_path)
+        self.assertEqual(fast, self.smiles_list)
+        self.assertEqual(fallback, self.smiles_list)
+
+        with MolPDFParser(path) as parser:
+            self.assertEqual(parser.extract_smiles_at(0), 'F/C=C\\F')
+            self.assertEqual(parser.extract_smiles_at(-1), 'CCO')
+            self.assertEqual(parser.extract_page_smiles(1), self.smiles_list)
+            self.assertEqual(parser.extract_page_smiles(0), [])
+
+if __name__ == '__main__':
+    unittest.main()
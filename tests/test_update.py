@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+#
+# MolPDF - Tests of the incremental updates of MolPDF.update
+#
+# ----------------------------------------------------------
+
+# imports
+# -------
+import os
+import shutil
+import tempfile
+import unittest
+
+from pdfminer.pdfpage import PDFPage
+from pdfrw import PdfReader
+
+from molpdf import MolPDF, MolPDFParser
+from molpdf.molpdf import _PDFObjectReader
+
+def library(count, offset=0):
+
+    """
+
+    Distinct small molecules, a chain with a growing number of substituents.
+
+    """
+
+    return ['C%sO' % ('C(N)' * ((index + offset) // 10) + 'C' * ((index + offset) % 10)) for index in range(count)]
+
+class UpdateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'library.pdf')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def generate(self, smiles, **options):
+        MolPDF(name=self.path).generate(smiles, in_memory=True, **options)
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def update(self, smiles, **options):
+        return MolPDF(name=self.path).update(smiles, in_memory=True, **options)
+
+    def sections(self):
+        with open(self.path, 'rb') as f:
+            return len(_PDFObjectReader(f).sections)
+
+    def assertDocument(self, smiles, pages=None, indexed=True):
+
+        """
+
+        Check the SMILES and the page count of the document through the trailer reader, pdfminer and pdfrw.
+
+        """
+
+        with MolPDFParser(self.path) as parser:
+            self.assertEqual(parser.extract_smiles(), smiles)
+            self.assertIsNotNone(parser._reader)
+
+        page_count = len(PdfReader(self.path).pages)
+
+        with MolPDFParser(self.path) as parser:
+            # Parsing the whole document first sends the parser down the pdfminer path
+            self.assertEqual(len(list(PDFPage.create_pages(parser.document))), page_count)
+            self.assertEqual(parser.extract_smiles(), smiles)
+
+        if pages is not None:
+            self.assertEqual(page_count, pages)
+
+        # Every molecule is found on exactly one page, in order
+        if indexed:
+            with MolPDFParser(self.path) as parser:
+                page_smiles = [parser.extract_page_smiles(page) for page in range(1, page_count + 1)]
+            self.assertEqual(sum(page_smiles, []), smiles)
+            self.assertTrue(all(page_smiles))
+
+        return page_count
+
+class TestUpdate(UpdateTestCase):
+
+    def test_append(self):
+
+        smiles = library(60)
+        original = self.generate(smiles, smiles_index=True)
+        pages = self.assertDocument(smiles)
+
+        smiles += library(70, offset=60)
+        stats = self.update(smiles, smiles_index=True)
+
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read().startswith(original))
+
+        self.assertEqual(self.sections(), 2)
+        self.assertGreater(self.assertDocument(smiles, stats.pages), pages)
+
+    def test_unchanged(self):
+
+        smiles = library(30)
+        original = self.generate(smiles, smiles_index=True)
+
+        self.update(smiles, smiles_index=True)
+
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_change_in_place(self):
+
+        smiles = library(150)
+        original = self.generate(smiles, smiles_index=True)
+        pages = self.assertDocument(smiles)
+        self.assertGreater(pages, 2)
+
+        with MolPDFParser(self.path) as parser:
+            second_page = parser.extract_page_smiles(2)
+
+        changed = list(smiles)
+        changed[smiles.index(second_page[1])] = 'c1ccccc1O'
+        stats = self.update(changed, smiles_index=True)
+
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read().startswith(original))
+
+        # Only the second page is redrawn
+        self.assertEqual(stats.molecules, len(second_page))
+        self.assertDocument(changed, pages)
+
+        with MolPDFParser(self.path) as parser:
+            self.assertIn('c1ccccc1O', parser.extract_page_smiles(2))
+
+    def test_insert_and_delete(self):
+
+        smiles = library(150)
+        original = self.generate(smiles, smiles_index=True)
+        self.assertDocument(smiles)
+
+        inserted = smiles[:100] + ['c1ccncc1', 'c1ccoc1'] + smiles[100:]
+        self.update(inserted, smiles_index=True)
+
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read().startswith(original))
+        self.assertDocument(inserted)
+
+        deleted = inserted[:10] + inserted[40:]
+        self.update(deleted, smiles_index=True)
+
+        self.assertEqual(self.sections(), 3)
+        self.assertDocument(deleted)
+
+    def test_not_indexed(self):
+
+        smiles = library(40)
+        original = self.generate(smiles)
+
+        # Appended molecules are written as an update even without the indexed SMILES stream
+        smiles += library(20, offset=40)
+        self.update(smiles)
+
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read().startswith(original))
+        self.assertEqual(self.sections(), 2)
+        self.assertDocument(smiles, indexed=False)
+
+        # Pages can not be matched to a changed molecule, the document is rebuilt
+        smiles[5] = 'c1ccccc1O'
+        self.update(smiles)
+
+        self.assertEqual(self.sections(), 1)
+        self.assertDocument(smiles, indexed=False)
+
+    def test_missing_document(self):
+
+        smiles = library(20)
+        self.update(smiles, smiles_index=True)
+
+        self.assertEqual(self.sections(), 1)
+        self.assertDocument(smiles)
+
+    def test_merged_shards(self):
+
+        smiles = library(120)
+        MolPDF(name=self.path).generate(smiles, in_memory=True, smiles_index=True, shard_size=50, merge=True)
+        with open(self.path, 'rb') as f:
+            original = f.read()
+        pages = self.assertDocument(smiles)
+
+        appended = smiles + library(30, offset=120)
+        self.update(appended, smiles_index=True)
+
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read().startswith(original))
+        self.assertGreater(self.assertDocument(appended), pages)
+
+        changed = list(appended)
+        changed[60] = 'c1ccccc1O'
+        self.update(changed, smiles_index=True)
+
+        self.assertEqual(self.sections(), 3)
+        self.assertDocument(changed)
+
+if __name__ == '__main__':
+    unittest.main()